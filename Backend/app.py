@@ -1,13 +1,14 @@
 import os
-import shutil
-import tempfile
+import asyncio
 from typing import Dict
 
-from fastapi import FastAPI, UploadFile, File, Depends, Form
+from fastapi import FastAPI, UploadFile, File, Depends, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
 from auth import router as auth_router, get_current_user, User
-from inference import predict_file
+from inference import predict_stream, REGISTRY
+from feature_cache import FEATURE_CACHE
+from inference_executor import INFERENCE_EXECUTOR, ExecutorSaturated
 from gemini import router as gemini_router
 
 app = FastAPI(title="Alzheimer Voice Lab API")
@@ -34,15 +35,42 @@ UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
+@app.on_event("startup")
+def preload_models():
+    REGISTRY.preload()
+
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    INFERENCE_EXECUTOR.shutdown(wait=False)
+
+
 @app.get("/")
 def root():
     return {"message": "Alzheimer Voice Lab API is running"}
 
+
+@app.get("/models")
+def list_models(current_user: User = Depends(get_current_user)):
+    """
+    Available models with loaded state, load time and memory footprint.
+    """
+    return REGISTRY.status()
+
+
+@app.get("/feature-cache")
+def feature_cache_stats(current_user: User = Depends(get_current_user)):
+    return FEATURE_CACHE.stats()
+
+
+
 @app.post("/predict")
 async def predict_endpoint(
     file: UploadFile = File(...),
     model_id: str = Form("cnn_lstm"),
     use_ensemble: bool = Form(False),
+    long_mode: bool = Form(False),
+    aggregate: str = Form("mean"),
     current_user: User = Depends(get_current_user),
 ):
     """
@@ -51,23 +79,35 @@ async def predict_endpoint(
         - gru_attn / gru-attention
     use_ensemble:
         - true / false
-    """
+    long_mode:
+        - true: score overlapping 300-frame windows over the whole recording
+          (up to LONG_MODE_MAX_SECONDS; otherwise STREAM_MAX_SECONDS)
+    aggregate (long_mode only):
+        - mean / max / attention
+
+    The response reports analysed_seconds and truncated (audio past the
+    cap is not scored).
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        temp_path = tmp.name
+    Runs on the inference worker pool; returns 503 when the pool is saturated.
+    """
 
     try:
-        result = predict_file(
-            temp_path,
-            model_id=model_id,
-            use_ensemble=use_ensemble,
+        future = INFERENCE_EXECUTOR.submit(
+            predict_stream,
+            file.file,
+            model_id,
+            use_ensemble,
+            long_mode,
+            aggregate,
+        )
+    except ExecutorSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": "5"},
         )
-    finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
 
-    return result
+    return await asyncio.wrap_future(future)
 
 
 @app.post("/generate-report")
@@ -1,80 +1,520 @@
+import time
+from contextlib import contextmanager
+
 import librosa
 import numpy as np
 import scipy.signal as signal
 
 
+# Framing shared by VAD, normalization and shimmer (librosa.feature.rms defaults)
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+
+
+@contextmanager
+def timed(timings, stage):
+    """Adds the block's wall time in ms to timings[stage]; no-op when timings is None"""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def frame_power(y, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    """
+    Mean square of every centred, zero-padded frame, i.e.
+    librosa.feature.rms(y=y, frame_length, hop_length)[0] ** 2.
+
+    Frames are summed from hop-sized block energies, so each sample is
+    squared once instead of once per overlapping frame.
+    """
+    if frame_length % hop_length:
+        raise ValueError("frame_length must be a multiple of hop_length")
+
+    n_frames = 1 + len(y) // hop_length
+    blocks_per_frame = frame_length // hop_length
+    n_blocks = n_frames - 1 + blocks_per_frame
+    pad = frame_length // 2
+
+    if pad % hop_length == 0:
+        # Blocks line up with y itself: no padded or squared copy of y
+        n_full = len(y) // hop_length
+        body = y[:n_full * hop_length].reshape(n_full, hop_length)
+        tail = y[n_full * hop_length:]
+
+        blocks = np.zeros(n_blocks, dtype=np.float64)
+        first = pad // hop_length
+        blocks[first:first + n_full] = np.einsum("ij,ij->i", body, body, dtype=np.float64)
+        blocks[first + n_full] += np.dot(tail.astype(np.float64), tail)
+    else:
+        energy = np.zeros(n_blocks * hop_length, dtype=np.float64)
+        energy[pad:pad + len(y)] = np.square(y)
+        blocks = energy.reshape(n_blocks, hop_length).sum(axis=1)
+
+    frames = np.lib.stride_tricks.sliding_window_view(blocks, blocks_per_frame)
+    return frames.sum(axis=1) / frame_length
+
+
+def split_nonsilent(y, top_db=60, ref=np.max, power=None, hop_length=HOP_LENGTH):
+    """
+    librosa.effects.split on precomputed frame_power(y) (computed here if
+    not given), so the VAD framing can be shared with other stages.
+    """
+    if power is None:
+        power = frame_power(y, hop_length=hop_length)
+
+    db = librosa.amplitude_to_db(np.sqrt(power), ref=ref, top_db=None)
+    non_silent = db > -top_db
+
+    edges = [np.flatnonzero(np.diff(non_silent.astype(int))) + 1]
+    if non_silent[0]:
+        edges.insert(0, np.array([0]))
+    if non_silent[-1]:
+        edges.append(np.array([len(non_silent)]))
+
+    edges = librosa.frames_to_samples(np.concatenate(edges), hop_length=hop_length)
+    return np.minimum(edges, len(y)).reshape((-1, 2))
+
+
 def gentle_denoise(y, sr):
 
     sos = signal.butter(4, 80, btype='highpass', fs=sr, output='sos')
     return signal.sosfilt(sos, y)
 
 
-def windowed_normalization(y, frame_length=2048):
+# "frame": gain interpolated between frame centres (hop-aware)
+# "legacy": each hop-spaced frame's gain repeated over frame_length samples,
+#           which stretches the envelope 4x
+NORMALIZATION_MODES = ("frame", "legacy")
+# The checked-in models were trained on "legacy" features; switch the
+# default only together with retrained models and a new threshold
+DEFAULT_NORMALIZATION = "legacy"
+NORMALIZATION_CHUNK = 1 << 16
+
 
-    rms = librosa.feature.rms(y=y, frame_length=frame_length)[0]
+def windowed_normalization(
+    y,
+    frame_length=FRAME_LENGTH,
+    hop_length=HOP_LENGTH,
+    mode=DEFAULT_NORMALIZATION,
+    chunk=NORMALIZATION_CHUNK,
+    out=None
+):
+    """
+    Divides y by its short-time RMS envelope and rescales to the mean RMS.
+
+    In "frame" mode the per-frame RMS is linearly interpolated to sample
+    resolution (frame t is centred on sample t * hop_length) one `chunk`
+    at a time, so the extra memory is O(chunk) rather than a full-length
+    gain array. Pass out=y to normalize in place.
+    """
+
+    rms = np.sqrt(frame_power(y, frame_length=frame_length, hop_length=hop_length))
     rms[rms == 0] = 1e-6
-    gain = np.repeat(rms, frame_length)[:len(y)]
-    return y / gain * np.mean(rms)
+    target = np.mean(rms)
 
+    if mode == "legacy":
+        gain = np.repeat(rms, frame_length)[:len(y)]
+        return y / gain * target
 
-def compute_jitter_shimmer(y, sr):
+    if mode != "frame":
+        raise ValueError(
+            f"Unknown normalization '{mode}'. Expected one of {NORMALIZATION_MODES}"
+        )
 
-    f0, voiced_flag, _ = librosa.pyin(
-        y,
-        fmin=75,
-        fmax=300,
-        sr=sr
+    if out is None:
+        out = np.array(y, dtype=np.float64)
+
+    centres = np.arange(len(rms)) * hop_length
+    for start in range(0, len(out), chunk):
+        end = min(start + chunk, len(out))
+        gain = np.interp(np.arange(start, end), centres, rms)
+        np.divide(target, gain, out=gain)
+        out[start:end] *= gain
+
+    return out
+
+
+F0_FMIN = 75
+F0_FMAX = 300
+F0_METHODS = ("pyin", "fast")
+# Octave-jump folding in the fast tracker: neighbours per side (~0.1 s at
+# hop 512 / 16 kHz) and how close to a whole octave a jump must be
+OCTAVE_CONTEXT_FRAMES = 3
+OCTAVE_JUMP_TOLERANCE = 0.25
+# Relative F0 deviation counted as a gross pitch error (the usual 20%)
+GROSS_PITCH_ERROR = 0.2
+
+
+def estimate_f0_fast(
+    y,
+    sr,
+    fmin=F0_FMIN,
+    fmax=F0_FMAX,
+    frame_length=2048,
+    hop_length=512,
+    threshold=0.1,
+    voicing_threshold=0.6,
+):
+    """
+    Vectorized YIN: the difference function of every frame is computed
+    in one FFT pass over the (n_frames, frame_length) frame matrix.
+    Framing matches librosa.pyin defaults.
+
+    The lag is the first trough under `threshold` (global minimum if
+    none); frames whose aperiodicity stays above `voicing_threshold`
+    are unvoiced (NaN), like pyin. In place of pyin's Viterbi smoothing,
+    isolated octave jumps are folded back (fold_octave_jumps), and
+    fallback lags far from their neighbours are searched again near
+    the neighbours' pitch.
+    """
+
+    min_lag = max(1, int(np.floor(sr / fmax)))
+    max_lag = int(np.ceil(sr / fmin))
+    window = frame_length - max_lag
+
+    y_pad = np.pad(y, frame_length // 2)
+    if len(y_pad) < frame_length:
+        return np.array([], dtype=np.float64)
+
+    frames = librosa.util.frame(
+        y_pad, frame_length=frame_length, hop_length=hop_length, axis=0
+    )
+
+    # r(tau) = sum_j x[j] * x[j + tau], j < window, for all frames at once
+    n_fft = int(2 ** np.ceil(np.log2(frame_length + window)))
+    spec_head = np.fft.rfft(frames[:, :window], n=n_fft, axis=1)
+    spec_full = np.fft.rfft(frames, n=n_fft, axis=1)
+    acf = np.fft.irfft(np.conj(spec_head) * spec_full, n=n_fft, axis=1)[:, :max_lag + 1]
+
+    # d(tau) = E[0:window] + E[tau:tau+window] - 2 r(tau)
+    energy = np.cumsum(np.pad(frames ** 2, ((0, 0), (1, 0))), axis=1)
+    lags = np.arange(max_lag + 1)
+    shifted_energy = energy[:, lags + window] - energy[:, lags]
+    diff = np.maximum(energy[:, [window]] + shifted_energy - 2 * acf, 0.0)
+
+    # Cumulative mean normalized difference
+    cumsum = np.cumsum(diff[:, 1:], axis=1)
+    cmndf = np.ones_like(diff)
+    cmndf[:, 1:] = diff[:, 1:] * lags[1:] / np.maximum(cumsum, 1e-12)
+
+    # First local minimum under the threshold in [min_lag, max_lag)
+    mid = cmndf[:, min_lag:max_lag]
+    is_trough = (
+        (mid < threshold)
+        & (mid <= cmndf[:, min_lag - 1:max_lag - 1])
+        & (mid <= cmndf[:, min_lag + 1:max_lag + 1])
     )
+    confident = is_trough.any(axis=1)
+    tau = np.where(
+        confident,
+        np.argmax(is_trough, axis=1),
+        np.argmin(mid, axis=1),
+    ) + min_lag
+
+    voiced = cmndf[np.arange(len(tau)), tau] < voicing_threshold
+    f0 = sr / _refine_lags(cmndf, tau, max_lag)
+    f0[~voiced] = np.nan
+
+    if voiced.any():
+        f0[voiced] = fold_octave_jumps(f0[voiced])
+
+        # YIN's "best local estimate": a fallback lag (no trough under the
+        # threshold) that is a gross error against its neighbours is
+        # searched again within GROSS_PITCH_ERROR of their pitch
+        rows = np.flatnonzero(voiced)
+        expected = 2.0 ** _neighbour_median(np.log2(f0[rows]))
+        stray = ~confident[rows] & (np.abs(f0[rows] / expected - 1) > GROSS_PITCH_ERROR)
+        if stray.any():
+            rows, expected = rows[stray], expected[stray]
+            lo = np.maximum(sr / (expected * (1 + GROSS_PITCH_ERROR)), min_lag)
+            hi = np.minimum(sr / (expected * (1 - GROSS_PITCH_ERROR)), max_lag - 1)
+            band = (lags >= lo[:, None]) & (lags <= hi[:, None])
+            rows, band = rows[band.any(axis=1)], band[band.any(axis=1)]
+            tau_local = np.argmin(np.where(band, cmndf[rows], np.inf), axis=1)
+            f0[rows] = sr / _refine_lags(cmndf[rows], tau_local, max_lag)
+
+    return f0
+
+
+def _refine_lags(cmndf, tau, max_lag):
+    """Parabolic interpolation of each row's CMNDF around its chosen lag"""
+    rows = np.arange(len(tau))
+    left = cmndf[rows, tau - 1]
+    centre = cmndf[rows, tau]
+    right = cmndf[rows, np.minimum(tau + 1, max_lag)]
+    denom = left - 2 * centre + right
+    shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / denom, 0.0)
+    return tau + np.clip(shift, -1, 1)
+
+
+def _neighbour_median(x, context=OCTAVE_CONTEXT_FRAMES):
+    """Median of the `context` values on each side of every element (itself excluded)"""
+    padded = np.pad(x, context, mode="edge")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * context + 1)
+    return np.median(np.delete(windows, context, axis=1), axis=1)
+
+
+def fold_octave_jumps(f0, context=OCTAVE_CONTEXT_FRAMES, tolerance=OCTAVE_JUMP_TOLERANCE):
+    """
+    f0: voiced F0 track (Hz, no NaN)
 
+    Halves / doubles only frames that sit an octave (within `tolerance`
+    octaves) away from the median of their `context` neighbours on each
+    side, the isolated jumps a YIN lag pick makes. Genuine excursions
+    move their neighbours too and are left alone.
+    """
+    if len(f0) < 3:
+        return f0
+
+    # Median of the neighbours only, so a jumping frame does not pull it
+    log_f0 = np.log2(f0)
+    offset = log_f0 - _neighbour_median(log_f0, context)
+
+    octaves = np.clip(np.round(offset), -1, 1)
+    jump = (octaves != 0) & (np.abs(offset - octaves) <= tolerance)
+    return np.where(jump, f0 * 2.0 ** -octaves, f0)
+
+
+def estimate_f0(y, sr, method="pyin"):
+    if method == "pyin":
+        f0, _, _ = librosa.pyin(
+            y,
+            fmin=F0_FMIN,
+            fmax=F0_FMAX,
+            sr=sr
+        )
+        return f0
+
+    if method == "fast":
+        return estimate_f0_fast(y, sr)
+
+    raise ValueError(f"Unknown f0 method '{method}'. Expected one of {F0_METHODS}")
+
+
+def jitter_from_f0(f0):
+    """Mean absolute F0 change (Hz) between consecutive voiced frames"""
     f0 = f0[~np.isnan(f0)]
-    jitter = np.mean(np.abs(np.diff(f0))) if len(f0) > 1 else 0.0
+    return np.mean(np.abs(np.diff(f0))) if len(f0) > 1 else 0.0
+
+
+def compute_jitter_shimmer(y, sr, f0_method="pyin", timings=None):
+
+    with timed(timings, "f0"):
+        f0 = estimate_f0(y, sr, method=f0_method)
+
+    jitter = jitter_from_f0(f0)
 
-    frame_amplitude = librosa.feature.rms(y=y)[0]
+    with timed(timings, "shimmer"):
+        frame_amplitude = np.sqrt(frame_power(y))
     shimmer = np.mean(np.abs(np.diff(frame_amplitude))) if len(frame_amplitude) > 1 else 0.0
 
     return jitter, shimmer
 
 
+def pause_durations(intervals, piece_starts, sr, min_pause_sec=0.15):
+    """
+    intervals: (K, 2) speech [start, end) samples, sorted
+    piece_starts: (K,) start sample of the span each interval belongs to
+
+    The gap before an interval is measured from the previous interval's
+    end, or from its span's start for the first interval of a span.
+    Returns the gaps (seconds) longer than min_pause_sec.
+    """
+    starts = intervals[:, 0]
+    prev_end = np.empty_like(starts)
+    prev_end[:1] = piece_starts[:1]
+    prev_end[1:] = intervals[:-1, 1]
+
+    first_in_piece = np.ones(len(starts), dtype=bool)
+    first_in_piece[1:] = piece_starts[1:] != piece_starts[:-1]
+    prev_end[first_in_piece] = piece_starts[first_in_piece]
+
+    gaps = (starts - prev_end) / sr
+    return gaps[gaps > min_pause_sec]
+
+
+# Below this many intervals, copying slices beats building a sample mask
+GATHER_MIN_INTERVALS = 4000
+
+
+def gather_intervals(y, intervals):
+    """
+    y[start:end] for every sorted, non-overlapping (start, end) row,
+    concatenated. Many intervals use one boolean gather instead of a
+    list of slices.
+    """
+    if len(intervals) < GATHER_MIN_INTERVALS:
+        return np.concatenate([y[start:end] for start, end in intervals])
+
+    # Alternating run lengths: gap, speech, gap, speech, ..., gap
+    runs = np.diff(np.concatenate([[0], intervals.ravel(), [len(y)]]))
+    is_speech = np.zeros(len(runs), dtype=bool)
+    is_speech[1::2] = True
+    return y[np.repeat(is_speech, runs)]
+
+
+WINDOW_POLICIES = ("full", "first", "loudest", "spread")
+
+
+def select_analysis_segments(y, sr, policy="full", window_sec=20.0, n_windows=3):
+    """
+    Decides up front which (start, end) sample ranges get analysed.
+
+    full    : the whole recording
+    first   : the first `window_sec` seconds
+    loudest : the `window_sec` span with the most energy
+    spread  : `n_windows` spans totalling `window_sec`, evenly spaced
+    """
+
+    n = len(y)
+    window = int(window_sec * sr)
+
+    if policy == "full" or n <= window:
+        return [(0, n)]
+
+    if policy == "first":
+        return [(0, window)]
+
+    if policy == "loudest":
+        # Energy on 100 ms blocks is plenty to place the window
+        block = max(1, sr // 10)
+        n_blocks = n // block
+        energy = np.sum(
+            np.square(y[:n_blocks * block]).reshape(n_blocks, block), axis=1
+        )
+        span = max(1, window // block)
+        window_energy = np.convolve(energy, np.ones(span), mode="valid")
+        start = int(np.argmax(window_energy)) * block
+        return [(start, min(start + window, n))]
+
+    if policy == "spread":
+        seg = window // n_windows
+        starts = np.linspace(0, n - seg, n_windows).astype(int)
+        return [(int(s), int(s) + seg) for s in starts]
+
+    raise ValueError(
+        f"Unknown window policy '{policy}'. Expected one of {WINDOW_POLICIES}"
+    )
+
+
 def preprocess_audio(
-    file_path,
+    source,
     sr=16000,
     vad_top_db=30,
-    min_pause_sec=0.15
+    min_pause_sec=0.15,
+    f0_method="pyin",
+    window_policy="full",
+    window_sec=20.0,
+    n_windows=3,
+    normalization=DEFAULT_NORMALIZATION,
+    timings=None
+):
+
+    """
+    source: path to an audio file, or a mono waveform already at `sr`
+    timings: optional dict that receives per-stage wall times in ms
+    """
+
+    if isinstance(source, np.ndarray):
+        y = source
+    else:
+        # "first" only ever needs the head of the file
+        duration = window_sec if window_policy == "first" else None
+        with timed(timings, "load"):
+            y, sr = librosa.load(source, sr=sr, duration=duration)
+
+    return preprocess_waveform(
+        y,
+        sr,
+        vad_top_db=vad_top_db,
+        min_pause_sec=min_pause_sec,
+        f0_method=f0_method,
+        window_policy=window_policy,
+        window_sec=window_sec,
+        n_windows=n_windows,
+        normalization=normalization,
+        timings=timings,
+    )
+
+
+def preprocess_waveform(
+    y,
+    sr,
+    vad_top_db=30,
+    min_pause_sec=0.15,
+    f0_method="pyin",
+    window_policy="full",
+    window_sec=20.0,
+    n_windows=3,
+    normalization=DEFAULT_NORMALIZATION,
+    timings=None
 ):
+    """
+    Same as preprocess_audio for an already decoded mono waveform at `sr`.
+
+    Only the spans chosen by `window_policy` are processed. Pause and
+    phonation statistics are computed within each span and pooled, so
+    span boundaries never count as pauses.
+
+    Every RMS-based stage (VAD reference, VAD, normalization, shimmer)
+    uses frame_power, so each signal is framed once.
+    """
 
-    y, sr = librosa.load(file_path, sr=sr)
-    y = librosa.util.normalize(y)
+    with timed(timings, "segments"):
+        segments = select_analysis_segments(y, sr, window_policy, window_sec, n_windows)
 
-    y = gentle_denoise(y, sr)
+        y = np.concatenate([y[start:end] for start, end in segments]) \
+            if len(segments) > 1 else y[segments[0][0]:segments[0][1]]
+        y = librosa.util.normalize(y)
 
-    intervals = librosa.effects.split(y, top_db=vad_top_db)
+    with timed(timings, "denoise"):
+        bounds = np.cumsum([0] + [end - start for start, end in segments])
+        pieces = [gentle_denoise(y[a:b], sr) for a, b in zip(bounds[:-1], bounds[1:])]
+        y = np.concatenate(pieces) if len(pieces) > 1 else pieces[0]
 
-    total_duration = len(y) / sr
-    speech_duration = np.sum([(end - start) / sr for start, end in intervals])
-    phonation_rate = speech_duration / total_duration
+    with timed(timings, "vad"):
+        powers = [frame_power(piece) for piece in pieces]
 
-    pauses = []
-    intra_sentence_pauses = 0
-    prev_end = 0
+        # Shared VAD reference so every span is judged against the same loudness
+        ref = np.max
+        if len(pieces) > 1:
+            ref = max(np.sqrt(np.max(power)) for power in powers)
 
-    for start, end in intervals:
-        pause = (start - prev_end) / sr
-        if pause > min_pause_sec:
-            pauses.append(pause)
-            if pause < 1.0:
-                intra_sentence_pauses += 1
-        prev_end = end
+        intervals = []
+        for offset, piece, power in zip(bounds[:-1], pieces, powers):
+            intervals.append(
+                split_nonsilent(piece, top_db=vad_top_db, ref=ref, power=power) + offset
+            )
+        counts = [len(piece_intervals) for piece_intervals in intervals]
+        intervals = np.concatenate(intervals).astype(int)
+        piece_starts = np.repeat(bounds[:-1], counts)
 
-    mean_pause = np.mean(pauses) if pauses else 0.0
-    pause_std = np.std(pauses) if pauses else 0.0
-    pause_count = len(pauses)
+    with timed(timings, "pauses"):
+        total_duration = len(y) / sr
+        speech_duration = np.sum((intervals[:, 1] - intervals[:, 0]) / sr)
+        phonation_rate = speech_duration / total_duration
 
-    y_speech = np.concatenate([y[start:end] for start, end in intervals]) \
-               if intervals.any() else y
+        pauses = pause_durations(intervals, piece_starts, sr, min_pause_sec)
+        intra_sentence_pauses = int(np.count_nonzero(pauses < 1.0))
 
-    y_speech = windowed_normalization(y_speech)
+        mean_pause = np.mean(pauses) if len(pauses) else 0.0
+        pause_std = np.std(pauses) if len(pauses) else 0.0
+        pause_count = len(pauses)
 
-    jitter, shimmer = compute_jitter_shimmer(y_speech, sr)
+    with timed(timings, "normalize"):
+        y_speech = gather_intervals(y, intervals) if intervals.any() else y
+
+        # y_speech is a fresh array here, so normalize it in place
+        y_speech = windowed_normalization(y_speech, mode=normalization, out=y_speech)
+
+    jitter, shimmer = compute_jitter_shimmer(
+        y_speech, sr, f0_method=f0_method, timings=timings
+    )
 
     prosody_vector = np.array([
         mean_pause,            
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import librosa
+import soundfile as sf
+import soxr
+
+
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", 60))
+# long_mode scores the whole recording, so it gets a much larger cap
+LONG_MODE_MAX_SECONDS = float(os.getenv("LONG_MODE_MAX_SECONDS", 1800))
+STREAM_BLOCK_FRAMES = 1 << 16
+
+
+def decode_stream(
+    fileobj,
+    sr=16000,
+    max_seconds=STREAM_MAX_SECONDS,
+    block_frames=STREAM_BLOCK_FRAMES,
+):
+    """
+    Decodes an audio file object straight into a mono float32 waveform at `sr`.
+
+    Reads `block_frames` at a time, downmixes and resamples each block
+    through a streaming soxr resampler (same HQ filter librosa.load uses),
+    and stops reading once `max_seconds` of output audio are collected,
+    so memory stays bounded regardless of upload size. A fully decoded
+    file is zero-padded to ceil(frames * sr / file_sr) samples, as
+    librosa.load does, so both return the same waveform.
+
+    Formats libsndfile cannot read (e.g. m4a) fall back to spooling the
+    upload to a temp file for librosa.load, still capped at `max_seconds`.
+
+    Returns: y (n,), sr, truncated (True if audio past max_seconds was dropped)
+    """
+
+    try:
+        return _decode_blocks(fileobj, sr, max_seconds, block_frames)
+    except sf.LibsndfileError:
+        fileobj.seek(0)
+        return _decode_via_tempfile(fileobj, sr, max_seconds)
+
+
+def _decode_blocks(fileobj, sr, max_seconds, block_frames):
+    max_samples = int(max_seconds * sr)
+
+    with sf.SoundFile(fileobj) as f:
+        in_sr = f.samplerate
+        resampler = None
+        if in_sr != sr:
+            resampler = soxr.ResampleStream(in_sr, sr, 1, dtype="float32", quality="HQ")
+
+        # Sized from the header when it has a length, so a large cap
+        # does not allocate a large buffer for a short upload
+        capacity = max_samples
+        if f.frames > 0:
+            capacity = min(max_samples, int(np.ceil(f.frames * sr / in_sr)) + block_frames)
+
+        out = np.empty(capacity, dtype=np.float32)
+        n_in = 0
+        n_out = 0
+        last = False
+        dropped = False
+
+        while n_out < max_samples:
+            block = f.read(block_frames, dtype="float32", always_2d=True)
+            last = len(block) < block_frames
+            n_in += len(block)
+
+            mono = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+
+            if resampler is not None:
+                mono = resampler.resample_chunk(mono, last=last)
+
+            take = min(len(mono), max_samples - n_out)
+            if n_out + take > len(out):
+                out = np.resize(out, min(max_samples, 2 * len(out) + take))
+            out[n_out:n_out + take] = mono[:take]
+            n_out += take
+            dropped = take < len(mono)
+
+            if last:
+                break
+
+        # Samples cut from the block that hit the cap, or blocks never read
+        truncated = dropped or (not last and len(f.read(1, dtype="float32")) > 0)
+
+        if not truncated and resampler is not None:
+            # The streaming resampler can end one sample short of the
+            # length librosa.resample pads its output to
+            expected = min(-(-n_in * sr // in_sr), max_samples)
+            if n_out < expected:
+                out = np.resize(out, max(len(out), expected))
+                out[n_out:expected] = 0.0
+                n_out = expected
+
+    return out[:n_out], sr, truncated
+
+
+def _decode_via_tempfile(fileobj, sr, max_seconds):
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        shutil.copyfileobj(fileobj, tmp)
+        temp_path = tmp.name
+
+    try:
+        y, sr = librosa.load(temp_path, sr=sr, duration=max_seconds)
+        truncated = librosa.get_duration(path=temp_path) > max_seconds
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return y.astype(np.float32), sr, truncated
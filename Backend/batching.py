@@ -0,0 +1,108 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 5))
+
+
+class MicroBatcher:
+    """
+    Gathers single samples from concurrent callers and scores them
+    in one forward pass.
+
+    A background thread takes the first pending sample, then keeps
+    collecting until `max_batch_size` samples are queued or `max_wait_ms`
+    has passed, stacks them and calls `predict_fn` once. Row i of the
+    output is routed back to the caller that submitted sample i.
+    """
+
+    def __init__(
+        self,
+        predict_fn,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        name="batcher",
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, x):
+        """x: one sample without the batch axis. Returns a Future."""
+        if self._stopped.is_set():
+            raise RuntimeError("MicroBatcher is stopped")
+
+        future = Future()
+        self._queue.put((x, future))
+        return future
+
+    def predict(self, x, timeout=None):
+        return self.submit(x).result(timeout=timeout)
+
+    def stop(self):
+        self._stopped.set()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+
+            batch = [(x, f) for x, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            xs = [x for x, _ in batch]
+            futures = [f for _, f in batch]
+
+            try:
+                out = np.asarray(self.predict_fn(np.stack(xs)))
+            except Exception as e:
+                for f in futures:
+                    f.set_exception(e)
+                continue
+
+            for i, f in enumerate(futures):
+                f.set_result(out[i])
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("MicroBatcher is stopped"))
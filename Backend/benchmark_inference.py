@@ -0,0 +1,57 @@
+import sys
+import time
+import numpy as np
+
+from inference import REGISTRY, TIME_STEPS, FEATURE_DIM
+
+N_CALLS = 200
+WARMUP_CALLS = 10
+BATCH_SIZES = [1, 8]
+
+
+def time_calls(fn, X, n_calls=N_CALLS):
+    for _ in range(WARMUP_CALLS):
+        fn(X)
+
+    times = []
+    for _ in range(n_calls):
+        start = time.perf_counter()
+        fn(X)
+        times.append((time.perf_counter() - start) * 1000)
+
+    return np.array(times)
+
+
+def report(label, times):
+    print(
+        f"  {label:<10} mean {times.mean():7.2f} ms | "
+        f"p50 {np.percentile(times, 50):7.2f} ms | "
+        f"p99 {np.percentile(times, 99):7.2f} ms"
+    )
+
+
+def main():
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else N_CALLS
+
+    if not REGISTRY.available_ids():
+        print("❌ No models found. Check 'models/' folder.")
+        sys.exit(1)
+
+    for model_id in REGISTRY.available_ids():
+        entry = REGISTRY.get(model_id)
+        model = entry.model
+
+        for batch_size in BATCH_SIZES:
+            X = np.random.rand(batch_size, TIME_STEPS, FEATURE_DIM).astype(np.float32)
+
+            keras_times = time_calls(lambda x: model.predict(x, verbose=0), X, n_calls)
+            compiled_times = time_calls(entry.predict_fn, X, n_calls)
+
+            print(f"\n⏱ {model_id} | batch={batch_size} | calls={n_calls}")
+            report("predict", keras_times)
+            report("compiled", compiled_times)
+            print(f"  speedup    {keras_times.mean() / compiled_times.mean():.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from audio_preprocessing import (
+    windowed_normalization,
+    frame_power,
+    FRAME_LENGTH,
+    HOP_LENGTH,
+)
+
+SR = 16000
+DURATIONS_SEC = [30, 300, 1800]
+REPEATS = 3
+
+# Max relative error of the gain at a frame centre vs target / rms[t]
+CENTRE_TOLERANCE = 1e-9
+# Output frame RMS must be within this of the target away from the step
+FLATNESS_TOLERANCE = 0.05
+
+
+def measure(fn, y, repeats=REPEATS):
+    """Best wall time (ms) and peak traced allocation (MB) of fn(y)"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(y)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(y)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(times) * 1000, peak / 2 ** 20
+
+
+def frame_rms(y):
+    rms = np.sqrt(frame_power(y))
+    rms[rms == 0] = 1e-6
+    return rms
+
+
+def check_alignment(rng):
+    """
+    1. At each frame centre t * hop, the applied gain equals target / rms[t].
+    2. For a signal whose level steps 10x halfway, the normalized output is
+       flat (frame RMS ~ target) everywhere except within one frame of the
+       step, i.e. the gain envelope follows the frames, not 4x slower.
+    """
+    n = SR * 10
+    step = n // 2
+    y = rng.normal(0, 0.01, n)
+    y[step:] *= 10
+
+    rms = frame_rms(y)
+    target = np.mean(rms)
+    failures = []
+
+    for mode in ("frame", "legacy"):
+        out = windowed_normalization(y, mode=mode)
+
+        centres = np.arange(len(rms)) * HOP_LENGTH
+        centres = centres[centres < n]
+        applied = out[centres] / y[centres]
+        centre_error = np.max(np.abs(applied / (target / rms[:len(centres)]) - 1))
+
+        out_rms = frame_rms(out)
+        frame_centres = np.arange(len(out_rms)) * HOP_LENGTH
+        away = (np.abs(frame_centres - step) > FRAME_LENGTH) \
+            & (frame_centres >= FRAME_LENGTH) & (frame_centres < n - FRAME_LENGTH)
+        flatness = np.max(np.abs(out_rms[away] / target - 1))
+
+        print(
+            f"  {mode:<7} gain error at frame centres {centre_error:.2e} | "
+            f"max level deviation away from step {flatness:.1%}"
+        )
+
+        if mode == "frame":
+            if centre_error > CENTRE_TOLERANCE:
+                failures.append("gain not aligned with frame centres")
+            if flatness > FLATNESS_TOLERANCE:
+                failures.append("output level not flat away from the step")
+
+    return failures
+
+
+def main():
+    durations = [float(d) for d in sys.argv[1:]] or DURATIONS_SEC
+    rng = np.random.default_rng(0)
+
+    print("🎯 Gain envelope alignment (level step at 5 s)")
+    failures = check_alignment(rng)
+
+    for duration in durations:
+        y = rng.normal(0, 0.1, int(SR * duration))
+
+        legacy_ms, legacy_mb = measure(lambda x: windowed_normalization(x, mode="legacy"), y)
+        frame_ms, frame_mb = measure(lambda x: windowed_normalization(x, mode="frame"), y)
+        inplace_ms, inplace_mb = measure(
+            lambda x: windowed_normalization(x, mode="frame", out=x), y.copy()
+        )
+
+        print(f"\n⏱ {duration:g}s signal ({y.nbytes / 2 ** 20:.1f} MB)")
+        print(f"  legacy    {legacy_ms:8.1f} ms | peak {legacy_mb:8.1f} MB")
+        print(f"  frame     {frame_ms:8.1f} ms | peak {frame_mb:8.1f} MB")
+        print(f"  in place  {inplace_ms:8.1f} ms | peak {inplace_mb:8.1f} MB")
+
+    if failures:
+        print("\n❌ " + "; ".join(failures))
+        sys.exit(1)
+
+    print("\n✅ Gain envelope is aligned with the frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import sys
+import time
+import numpy as np
+
+from audio_preprocessing import pause_durations, gather_intervals
+
+SR = 16000
+DURATION_SEC = 600
+FRAME_HOP = 512
+# A 10 min recording has ~18.7k VAD frames, so ~9k intervals is the ceiling
+INTERVAL_COUNTS = [100, 1000, 5000, 9000]
+N_PIECES = 3
+REPEATS = 5
+
+
+def synthetic_intervals(n_intervals, rng, sr=SR, duration_sec=DURATION_SEC):
+    """
+    Random noise signal plus `n_intervals` sorted, non-overlapping
+    speech intervals on the VAD frame grid, spread over N_PIECES spans
+    like the multi-window policies produce.
+    """
+    n = int(sr * duration_sec)
+    y = rng.normal(0, 0.1, n)
+
+    n_frames = n // FRAME_HOP
+    cuts = np.sort(rng.choice(np.arange(1, n_frames), 2 * n_intervals, replace=False))
+    intervals = cuts.reshape(-1, 2) * FRAME_HOP
+
+    bounds = np.linspace(0, n, N_PIECES + 1).astype(int)
+    piece_starts = bounds[np.searchsorted(bounds, intervals[:, 0], side="right") - 1]
+    return y, intervals, piece_starts
+
+
+def loop_pauses(intervals, piece_starts, sr, min_pause_sec=0.15):
+    """The previous per-interval implementation"""
+    speech_duration = np.sum([(end - start) / sr for start, end in intervals])
+
+    pauses = []
+    intra_sentence_pauses = 0
+    prev_end = 0
+    prev_piece = 0
+
+    for (start, end), piece_start in zip(intervals, piece_starts):
+        if piece_start != prev_piece:
+            prev_end = piece_start
+            prev_piece = piece_start
+        pause = (start - prev_end) / sr
+        if pause > min_pause_sec:
+            pauses.append(pause)
+            if pause < 1.0:
+                intra_sentence_pauses += 1
+        prev_end = end
+
+    return speech_duration, np.array(pauses), intra_sentence_pauses
+
+
+def vectorized_pauses(intervals, piece_starts, sr, min_pause_sec=0.15):
+    speech_duration = np.sum((intervals[:, 1] - intervals[:, 0]) / sr)
+    pauses = pause_durations(intervals, piece_starts, sr, min_pause_sec)
+    return speech_duration, pauses, int(np.count_nonzero(pauses < 1.0))
+
+
+def loop_gather(y, intervals):
+    return np.concatenate([y[start:end] for start, end in intervals])
+
+
+def best_time(fn, *args, repeats=REPEATS):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+
+def main():
+    counts = [int(c) for c in sys.argv[1:]] or INTERVAL_COUNTS
+    rng = np.random.default_rng(0)
+    failed = False
+
+    print(f"Synthetic {DURATION_SEC}s signal at {SR} Hz, best of {REPEATS}")
+
+    for n_intervals in counts:
+        y, intervals, piece_starts = synthetic_intervals(n_intervals, rng)
+
+        loop_ms, ref = best_time(loop_pauses, intervals, piece_starts, SR)
+        vec_ms, out = best_time(vectorized_pauses, intervals, piece_starts, SR)
+        cat_ms, ref_speech = best_time(loop_gather, y, intervals)
+        gather_ms, speech = best_time(gather_intervals, y, intervals)
+
+        same = (
+            ref[0] == out[0]
+            and np.array_equal(ref[1], out[1])
+            and ref[2] == out[2]
+            and np.array_equal(ref_speech, speech)
+        )
+        failed |= not same
+
+        print(f"\n⏱ {n_intervals} intervals | {'identical' if same else 'MISMATCH'}")
+        print(f"  pause stats  loop {loop_ms:8.2f} ms | vectorized {vec_ms:7.2f} ms | {loop_ms / vec_ms:6.1f}x")
+        print(f"  speech       loop {cat_ms:8.2f} ms | gather     {gather_ms:7.2f} ms | {cat_ms / gather_ms:6.1f}x")
+
+    if failed:
+        print("\n❌ Vectorized VAD statistics differ from the loop")
+        sys.exit(1)
+
+    print("\n✅ Vectorized VAD statistics match the loop")
+
+
+if __name__ == "__main__":
+    main()
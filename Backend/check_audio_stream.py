@@ -0,0 +1,74 @@
+import io
+import sys
+import numpy as np
+import librosa
+import soundfile as sf
+
+from audio_stream import decode_stream
+
+SR = 16000
+BLOCK = 1 << 12
+
+# (file frames, cap in samples): around block edges and the end of the file
+CASES = [
+    (10 * BLOCK, 10 * BLOCK - 100),  # ends on a block edge, cap inside the last block
+    (10 * BLOCK, 10 * BLOCK),        # cap exactly at the end
+    (10 * BLOCK, 9 * BLOCK),         # cap on an inner block edge
+    (10 * BLOCK, 9 * BLOCK + 1),     # one sample into the last block
+    (10 * BLOCK + 7, 10 * BLOCK),    # short final block left unread
+    (10 * BLOCK + 7, 10 * BLOCK + 7),
+    (10 * BLOCK + 7, 20 * BLOCK),    # cap well past the end
+]
+
+# Resampled full decodes must match librosa.load sample for sample;
+# 661828 frames at 44.1 kHz is where the stream used to end one short
+RESAMPLE_SR = 44100
+RESAMPLE_FRAMES = [661828, 485336, 10 * BLOCK, 10 * BLOCK + 7, 99991]
+
+
+def wav_bytes(n_frames, sr=SR, seed=0):
+    y = np.random.default_rng(seed).uniform(-0.5, 0.5, n_frames).astype(np.float32)
+    buf = io.BytesIO()
+    sf.write(buf, y, sr, format="WAV", subtype="FLOAT")
+    return buf.getvalue(), y
+
+
+def main():
+    failed = False
+
+    print(f"{'frames':>8} {'cap':>8} {'decoded':>8} {'truncated':>9}")
+    for n_frames, cap in CASES:
+        data, y_ref = wav_bytes(n_frames)
+        y, _, truncated = decode_stream(
+            io.BytesIO(data), sr=SR, max_seconds=cap / SR, block_frames=BLOCK
+        )
+
+        expected_len = min(n_frames, cap)
+        ok = (
+            len(y) == expected_len
+            and truncated == (n_frames > cap)
+            and np.array_equal(y, y_ref[:expected_len])
+        )
+        failed |= not ok
+        print(f"{n_frames:8d} {cap:8d} {len(y):8d} {str(truncated):>9}  {'ok' if ok else 'MISMATCH'}")
+
+    print(f"\n{'frames':>8} {'decoded':>8} {'librosa':>8} {'max diff':>9}")
+    for n_frames in RESAMPLE_FRAMES:
+        data, _ = wav_bytes(n_frames, sr=RESAMPLE_SR)
+        y, _, truncated = decode_stream(io.BytesIO(data), sr=SR, max_seconds=3600)
+        y_ref, _ = librosa.load(io.BytesIO(data), sr=SR)
+
+        n = min(len(y), len(y_ref))
+        diff = float(np.abs(y[:n] - y_ref[:n]).max())
+        ok = len(y) == len(y_ref) and diff < 1e-6 and not truncated
+        failed |= not ok
+        print(f"{n_frames:8d} {len(y):8d} {len(y_ref):8d} {diff:9.2e}  {'ok' if ok else 'MISMATCH'}")
+
+    if failed:
+        print("❌ decode_stream length / truncated flag is wrong")
+        sys.exit(1)
+    print("✅ decode_stream matches librosa.load and reports truncation correctly")
+
+
+if __name__ == "__main__":
+    main()
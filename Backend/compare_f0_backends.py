@@ -0,0 +1,143 @@
+import os
+import sys
+import glob
+import time
+import numpy as np
+
+from audio_preprocessing import (
+    GROSS_PITCH_ERROR,
+    preprocess_audio,
+    estimate_f0,
+    jitter_from_f0,
+)
+
+TEST_DIR = os.path.join("..", "test", "alzheimer")
+
+# The tolerances are validated on the features the served models use
+NORMALIZATION = "legacy"
+
+# pyin reports F0 on a grid of PYIN_RESOLUTION semitones (librosa's default),
+# so its jitter (mean |dF0|) is only resolved to about one grid step at the
+# recording's median F0; the fast tracker's jitter must be within that step
+PYIN_RESOLUTION = 0.1
+# Each gross pitch error (F0 off by more than GROSS_PITCH_ERROR) adds two
+# steps of at least GROSS_PITCH_ERROR * F0 to jitter's |dF0| sum; past this
+# fraction of jointly voiced frames they alone would exceed one grid step
+MAX_GROSS_ERROR_RATE = (2 ** (PYIN_RESOLUTION / 12) - 1) / (2 * GROSS_PITCH_ERROR)
+# Jitter is only comparable when measured on mostly the same speech: jointly
+# voiced frames must be the majority of the frames either tracker voices
+MIN_VOICED_OVERLAP = 0.5
+# Half a semitone: reported per recording, and required on every frame of a
+# clean synthetic tone, where the true F0 is known and unambiguous
+PITCH_TOLERANCE_CENTS = 50
+
+GLIDE_SR = 16000
+HOP_LENGTH = 512
+
+
+def frame_agreement(f0_ref, f0_fast):
+    """
+    Returns: gross error rate and fraction within PITCH_TOLERANCE_CENTS on
+    jointly voiced frames, voiced overlap (jointly / either voiced)
+    """
+    n = min(len(f0_ref), len(f0_fast))
+    f0_ref, f0_fast = f0_ref[:n], f0_fast[:n]
+
+    voiced_ref = ~np.isnan(f0_ref)
+    voiced_fast = ~np.isnan(f0_fast)
+    both = voiced_ref & voiced_fast
+
+    overlap = both.sum() / max((voiced_ref | voiced_fast).sum(), 1)
+    if not both.any():
+        return 1.0, 0.0, float(overlap)
+
+    ratio = f0_fast[both] / f0_ref[both]
+    gross = np.mean(np.abs(ratio - 1) > GROSS_PITCH_ERROR)
+    fine = np.mean(1200 * np.abs(np.log2(ratio)) <= PITCH_TOLERANCE_CENTS)
+    return float(gross), float(fine), float(overlap)
+
+
+def check_glide(sr=GLIDE_SR):
+    """
+    Harmonic tone held at 110 Hz, then rising to 250 Hz, more than an
+    octave above its median pitch: a real excursion the octave-error
+    handling must not fold. Returns the fraction of frames within
+    PITCH_TOLERANCE_CENTS of the true F0.
+    """
+    t = np.arange(4 * sr) / sr
+    f = np.where(t < 2.5, 110.0, 110.0 * (250 / 110) ** ((t - 2.5) / 1.5))
+    phase = 2 * np.pi * np.cumsum(f) / sr
+    y = 0.3 * sum(np.sin(k * phase) / k for k in range(1, 6))
+
+    f0 = estimate_f0(y, sr, method="fast")
+    true = np.interp(np.arange(len(f0)) * HOP_LENGTH / sr, t, f)
+    cents = 1200 * np.abs(np.log2(f0 / true))
+    return float(np.mean(cents <= PITCH_TOLERANCE_CENTS))
+
+
+def main():
+    test_dir = sys.argv[1] if len(sys.argv) > 1 else TEST_DIR
+    files = sorted(glob.glob(os.path.join(test_dir, "*.wav")))
+
+    if not files:
+        print(f"❌ No .wav files found in {test_dir}")
+        sys.exit(1)
+
+    failed = []
+
+    for path in files:
+        y_speech, sr, _ = preprocess_audio(path, normalization=NORMALIZATION)
+
+        start = time.perf_counter()
+        f0_ref = estimate_f0(y_speech, sr, method="pyin")
+        pyin_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        f0_fast = estimate_f0(y_speech, sr, method="fast")
+        fast_time = time.perf_counter() - start
+
+        jitter_ref = jitter_from_f0(f0_ref)
+        jitter_fast = jitter_from_f0(f0_fast)
+        grid_step = np.nanmedian(f0_ref) * (2 ** (PYIN_RESOLUTION / 12) - 1)
+        gross, fine, overlap = frame_agreement(f0_ref, f0_fast)
+
+        ok = (
+            abs(jitter_fast - jitter_ref) <= grid_step
+            and gross <= MAX_GROSS_ERROR_RATE
+            and overlap >= MIN_VOICED_OVERLAP
+        )
+        if not ok:
+            failed.append(path)
+
+        print(
+            f"{'✅' if ok else '❌'} {os.path.basename(path)} | "
+            f"jitter pyin {jitter_ref:.3f} fast {jitter_fast:.3f} "
+            f"(off {abs(jitter_fast - jitter_ref):.3f} Hz, grid step {grid_step:.3f}) | "
+            f"gross errors {gross:.2%} | within {PITCH_TOLERANCE_CENTS} cents {fine:.0%} | "
+            f"voiced overlap {overlap:.0%} | time pyin {pyin_time:.2f}s fast {fast_time:.2f}s"
+        )
+
+    glide = check_glide()
+    glide_ok = glide == 1.0
+    print(
+        f"{'✅' if glide_ok else '❌'} synthetic 110 -> 250 Hz glide | "
+        f"frames within {PITCH_TOLERANCE_CENTS} cents of the true F0 {glide:.0%}"
+    )
+
+    if failed or not glide_ok:
+        print(
+            f"\n❌ {len(failed)} file(s) outside tolerance (jitter within one "
+            f"{PYIN_RESOLUTION}-semitone pyin step, gross errors <= {MAX_GROSS_ERROR_RATE:.2%}, "
+            f"voiced overlap >= {MIN_VOICED_OVERLAP:.0%}); glide {'ok' if glide_ok else 'failed'}"
+        )
+        sys.exit(1)
+
+    print(
+        f"\n✅ Fast tracker within tolerance of pyin on {len(files)} file(s): "
+        f"jitter within one pyin grid step, gross errors <= {MAX_GROSS_ERROR_RATE:.2%}, "
+        f"and the synthetic glide is tracked"
+    )
+
+
+if __name__ == "__main__":
+    main()
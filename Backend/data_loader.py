@@ -1,13 +1,18 @@
 import os
 import numpy as np
 
+from dataset_store import MANIFEST_FILE, open_store
+
 PROCESSED_DIR = "data/processed"
+MANIFEST_PATH = os.path.join(PROCESSED_DIR, MANIFEST_FILE)
 
 X_TRAIN_FILE = os.path.join(PROCESSED_DIR, "X_train.npy")
 X_VAL_FILE   = os.path.join(PROCESSED_DIR, "X_val.npy")
 y_TRAIN_FILE = os.path.join(PROCESSED_DIR, "y_train.npy")
 y_VAL_FILE   = os.path.join(PROCESSED_DIR, "y_val.npy")
 
+SHUFFLE_BUFFER = 8192
+
 
 def load_dataset(test_only=False):
     """
@@ -17,6 +22,10 @@ def load_dataset(test_only=False):
 
         If test_only=True:
             None, None, X_val, y_val
+
+    X_* are memory-mapped, read-only views (ShardedArray for the sharded
+    store, np.memmap for legacy .npy files); rows are read from disk
+    on access. Use np.asarray() to materialize.
     """
 
     if not os.path.exists(PROCESSED_DIR):
@@ -24,14 +33,28 @@ def load_dataset(test_only=False):
             "Processed data not found. Run data_pipeline.py first."
         )
 
-    X_val = np.load(X_VAL_FILE)
-    y_val = np.load(y_VAL_FILE)
+    if os.path.exists(MANIFEST_PATH):
+        X_all, y_all, manifest = open_store(PROCESSED_DIR)
+        splits = manifest["splits"]
+
+        X_val = X_all.take(splits["val"])
+        y_val = y_all[splits["val"]]
+
+        if test_only:
+            return None, None, X_val, y_val
+
+        X_train = X_all.take(splits["train"])
+        y_train = y_all[splits["train"]]
 
-    if test_only:
-        return None, None, X_val, y_val
+    else:
+        X_val = np.load(X_VAL_FILE, mmap_mode="r")
+        y_val = np.load(y_VAL_FILE)
 
-    X_train = np.load(X_TRAIN_FILE)
-    y_train = np.load(y_TRAIN_FILE)
+        if test_only:
+            return None, None, X_val, y_val
+
+        X_train = np.load(X_TRAIN_FILE, mmap_mode="r")
+        y_train = np.load(y_TRAIN_FILE)
 
     assert X_train.ndim == 3, "X_train must be 3D (samples, time, features)"
     assert X_val.ndim == 3, "X_val must be 3D (samples, time, features)"
@@ -44,3 +67,70 @@ def load_dataset(test_only=False):
     print(f"Feature dim: {X_train.shape[2]}")
 
     return X_train, y_train, X_val, y_val
+
+
+def make_tf_dataset(
+    X,
+    y,
+    batch_size=32,
+    shuffle=False,
+    shuffle_buffer=SHUFFLE_BUFFER,
+    augment_fn=None,
+    num_parallel_calls=None,
+    seed=42,
+    threads=None,
+):
+    """
+    Streams (X, y) batches from a memory-mapped view without loading it.
+
+    Only row indices are shuffled (bounded buffer); each batch is then
+    gathered from disk and optionally passed through `augment_fn`
+    (numpy (B, T, F) -> (B, T, F)) on parallel map workers, and batches
+    are prefetched so data preparation overlaps with training.
+    `threads` gives the pipeline its own thread pool of that size, so
+    concurrent training jobs keep to their CPU budgets.
+    """
+    import tensorflow as tf
+
+    autotune = tf.data.AUTOTUNE
+    num_parallel_calls = num_parallel_calls or autotune
+    time_steps, feature_dim = X.shape[1], X.shape[2]
+    labels = np.asarray(y, dtype=np.float32)
+
+    def gather(idx):
+        return np.asarray(X[idx], dtype=np.float32), labels[idx]
+
+    def load_batch(idx):
+        xb, yb = tf.numpy_function(gather, [idx], [tf.float32, tf.float32])
+        xb.set_shape((None, time_steps, feature_dim))
+        yb.set_shape((None,))
+        return xb, yb
+
+    ds = tf.data.Dataset.range(len(labels))
+    if shuffle:
+        ds = ds.shuffle(
+            min(shuffle_buffer, len(labels)),
+            seed=seed,
+            reshuffle_each_iteration=True,
+        )
+
+    ds = ds.batch(batch_size).map(load_batch, num_parallel_calls=num_parallel_calls)
+
+    if augment_fn is not None:
+        def augment(xb, yb):
+            xb_aug = tf.numpy_function(
+                lambda a: np.asarray(augment_fn(a), dtype=np.float32),
+                [xb],
+                tf.float32,
+            )
+            xb_aug.set_shape(xb.shape)
+            return xb_aug, yb
+
+        ds = ds.map(augment, num_parallel_calls=num_parallel_calls)
+
+    if threads:
+        options = tf.data.Options()
+        options.threading.private_threadpool_size = threads
+        ds = ds.with_options(options)
+
+    return ds.prefetch(autotune)
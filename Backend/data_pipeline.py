@@ -1,128 +1,315 @@
 import os
-import random
-import tempfile
+import sys
+import zlib
+import argparse
 import numpy as np
 import librosa
-import soundfile as sf
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sklearn.model_selection import train_test_split
 
 from audio_preprocessing import preprocess_audio
+from dataset_store import ShardWriter, WaveformWriter
+from features import TIME_STEPS, FEATURE_DIM, PROSODY_DIM, extract_features_batch
 
 RAW_DIR = "data/raw_real"
 OUT_DIR = "data/processed"
+WAVEFORM_DIR = "data/waveforms"
+UNITS_DIR = os.path.join(OUT_DIR, "units")
 
 SAMPLE_RATE = 16000
-MAX_TIME_STEPS = 300
+MAX_TIME_STEPS = TIME_STEPS
 AUG_PER_FILE = 13
+SEED = 42
+AUGMENT_MODES = ("waveform", "spectral")
+
+CLASSES = [("control", 0), ("alzheimer", 1)]
 
 os.makedirs(OUT_DIR, exist_ok=True)
 
-def augment_audio(y, sr):
+def augment_audio(y, sr, rng):
     """Safe audio augmentation (raw waveform)"""
 
     # Gaussian noise
-    if random.random() < 0.6:
-        y = y + np.random.normal(0, 0.005, len(y))
+    if rng.random() < 0.6:
+        y = y + rng.normal(0, 0.005, len(y))
 
     # Pitch shift
-    if random.random() < 0.5:
+    if rng.random() < 0.5:
         y = librosa.effects.pitch_shift(
-            y=y, sr=sr, n_steps=random.uniform(-2, 2)
+            y=y, sr=sr, n_steps=rng.uniform(-2, 2)
         )
 
     # Time stretch
-    if random.random() < 0.5:
+    if rng.random() < 0.5:
         y = librosa.effects.time_stretch(
-            y=y, rate=random.uniform(0.9, 1.1)
+            y=y, rate=rng.uniform(0.9, 1.1)
         )
 
     return np.nan_to_num(y)
 
-def extract_feature_matrix(file_path):
+def extract_feature_matrix(source, sr=SAMPLE_RATE):
+    """
+    source: path to an audio file, or a mono waveform already at `sr`
+    Returns shape: (MAX_TIME_STEPS, 47)
+    """
+    return extract_feature_matrices([source], sr=sr)[0]
+
+def extract_feature_matrices(sources, sr=SAMPLE_RATE, out=None):
     """
-    Returns shape: (MAX_TIME_STEPS, 45)
+    Preprocesses each source, then computes all MFCCs in stacked batches
+    straight into `out` (N, MAX_TIME_STEPS, 47), allocated if not given.
     """
-    y, sr, prosody = preprocess_audio(file_path)
+    speech = []
+    prosody = np.empty((len(sources), PROSODY_DIM), dtype=np.float32)
+
+    for i, source in enumerate(sources):
+        y, _, prosody[i] = preprocess_audio(source, sr=sr)
+        speech.append(y)
+
+    return extract_features_batch(speech, prosody, sr, out=out)
+
+def list_work_units():
+    """
+    One unit per (class, file, augmentation index); index 0 is the
+    original recording. Sorted so every run sees the same order.
+    """
+    units = []
+
+    for class_name, label in CLASSES:
+        class_dir = os.path.join(RAW_DIR, class_name)
+
+        for fname in sorted(os.listdir(class_dir)):
+            if not fname.endswith(".wav"):
+                continue
+
+            for aug_idx in range(AUG_PER_FILE + 1):
+                units.append((class_name, label, fname, aug_idx))
+
+    return units
 
-    mfcc = librosa.feature.mfcc(
-        y=y, sr=sr, n_mfcc=40, n_fft=1024, hop_length=512
+def unit_seed(seed, class_name, fname, aug_idx):
+    """Per-unit seed, independent of which worker runs the unit or when"""
+    file_key = zlib.crc32(f"{class_name}/{fname}".encode())
+    return np.random.SeedSequence([seed, file_key, aug_idx])
+
+def unit_path(class_name, fname, aug_idx, seed=SEED, mode="waveform"):
+    run_dir = f"seed_{seed}" if mode == "waveform" else f"seed_{seed}_{mode}"
+    return os.path.join(
+        UNITS_DIR, run_dir, class_name, f"{fname}__{aug_idx:02d}.npy"
     )
 
-    mfcc = mfcc.T
-    if mfcc.shape[0] > MAX_TIME_STEPS:
-        mfcc = mfcc[:MAX_TIME_STEPS]
-    else:
-        mfcc = np.pad(
-            mfcc,
-            ((0, MAX_TIME_STEPS - mfcc.shape[0]), (0, 0))
-        )
+def save_unit(features, class_name, fname, aug_idx, seed=SEED, mode="waveform"):
+    # Write-then-rename so a crash never leaves a half-written unit behind
+    out_path = unit_path(class_name, fname, aug_idx, seed, mode)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_out = out_path + ".tmp.npy"
+    np.save(tmp_out, features)
+    os.replace(tmp_out, out_path)
+
+    return out_path
+
+def process_file_waveform(class_name, fname, aug_ids, seed=SEED):
+    """
+    Waveform mode: all pending units of one recording. The recording is
+    decoded once; each augmentation works on a copy of that waveform,
+    and all features come out of one batched MFCC pass.
+    """
+    file_path = os.path.join(RAW_DIR, class_name, fname)
+    y_raw, sr = librosa.load(file_path, sr=SAMPLE_RATE)
 
-    prosody_rep = np.repeat(
-        prosody[np.newaxis, :],
-        MAX_TIME_STEPS,
-        axis=0
+    sources = []
+    for aug_idx in aug_ids:
+        if aug_idx == 0:
+            sources.append(y_raw)
+        else:
+            rng = np.random.default_rng(unit_seed(seed, class_name, fname, aug_idx))
+            sources.append(augment_audio(y_raw, sr, rng).astype(np.float32))
+
+    rows = extract_feature_matrices(sources, sr=sr)
+    return [
+        save_unit(features, class_name, fname, aug_idx, seed)
+        for aug_idx, features in zip(aug_ids, rows)
+    ]
+
+def process_file_spectral(class_name, fname, aug_ids, seed=SEED):
+    """
+    Spectral mode: all pending units of one recording. The recording is
+    preprocessed and transformed once; its augmentations come out of one
+    batched mel-domain pass (see spectral_augmentation.py).
+    """
+    from spectral_augmentation import (
+        clean_mel, stack_mels, clean_features_batch, spectral_augment_batch
     )
 
-    return np.hstack([mfcc, prosody_rep]).astype(np.float32)
+    file_path = os.path.join(RAW_DIR, class_name, fname)
+    y_speech, sr, prosody = preprocess_audio(file_path, sr=SAMPLE_RATE)
+
+    mel, peak_db = clean_mel(y_speech, sr)
+    mel, lengths = stack_mels([mel])
+    peak_db = np.array([peak_db])
+    prosody = prosody[np.newaxis, :]
+
+    paths = []
+    if 0 in aug_ids:
+        features = clean_features_batch(mel, lengths, peak_db, prosody)[0]
+        paths.append(save_unit(features, class_name, fname, 0, seed, "spectral"))
 
-def process_class(class_name, label):
-    X, y = [], []
-    class_dir = os.path.join(RAW_DIR, class_name)
+    aug_ids = [a for a in aug_ids if a != 0]
+    if aug_ids:
+        rngs = [np.random.default_rng(unit_seed(seed, class_name, fname, a)) for a in aug_ids]
+        n = len(aug_ids)
+        rows = spectral_augment_batch(
+            np.broadcast_to(mel, (n,) + mel.shape[1:]),
+            np.repeat(lengths, n),
+            np.repeat(peak_db, n),
+            np.repeat(prosody, n, axis=0),
+            rngs,
+            sr=sr,
+        )
+        for aug_idx, features in zip(aug_ids, rows):
+            paths.append(save_unit(features, class_name, fname, aug_idx, seed, "spectral"))
 
-    for fname in os.listdir(class_dir):
-        if not fname.endswith(".wav"):
-            continue
+    return paths
 
-        file_path = os.path.join(class_dir, fname)
+def _group_jobs(pending):
+    """One job per recording, so each source is decoded once per job"""
+    jobs = {}
+    for class_name, _, fname, aug_idx in pending:
+        jobs.setdefault((class_name, fname), []).append(aug_idx)
+    return [(class_name, fname, aug_ids) for (class_name, fname), aug_ids in jobs.items()]
 
-    
-        X.append(extract_feature_matrix(file_path))
-        y.append(label)
+def run_job(class_name, fname, aug_ids, seed=SEED, mode="waveform"):
+    if mode == "spectral":
+        return process_file_spectral(class_name, fname, aug_ids, seed)
+    return process_file_waveform(class_name, fname, aug_ids, seed)
 
-        y_raw, sr = librosa.load(file_path, sr=SAMPLE_RATE)
+def run_units(units, workers=1, seed=SEED, mode="waveform"):
+    """
+    Runs every unit not already on disk. workers=1 runs serially in
+    this process; results are identical either way.
+    """
+    pending = [
+        u for u in units
+        if not os.path.exists(unit_path(u[0], u[2], u[3], seed, mode))
+    ]
 
-        for _ in range(AUG_PER_FILE):
-            aug_audio = augment_audio(y_raw, sr)
-            tmp_path = None
+    print(f"🧩 {len(units) - len(pending)}/{len(units)} units done, {len(pending)} to go")
 
-            try:
-                with tempfile.NamedTemporaryFile(
-                    suffix=".wav", delete=False
-                ) as tmp:
-                    tmp_path = tmp.name
+    jobs = _group_jobs(pending)
 
-                sf.write(tmp_path, aug_audio, sr)
-                X.append(extract_feature_matrix(tmp_path))
-                y.append(label)
+    if workers <= 1:
+        for i, (class_name, fname, aug_ids) in enumerate(jobs, 1):
+            run_job(class_name, fname, aug_ids, seed, mode)
+            print(f"  [{i}/{len(jobs)}] {class_name}/{fname} #{','.join(map(str, aug_ids))}")
+        return
 
-            finally:
-                if tmp_path and os.path.exists(tmp_path):
-                    os.remove(tmp_path)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_job, class_name, fname, aug_ids, seed, mode):
+                (class_name, fname, aug_ids)
+            for class_name, fname, aug_ids in jobs
+        }
 
-    return X, y
+        for i, future in enumerate(as_completed(futures), 1):
+            class_name, fname, aug_ids = futures[future]
+            future.result()
+            print(f"  [{i}/{len(jobs)}] {class_name}/{fname} #{','.join(map(str, aug_ids))}")
 
-def main():
-    X, y = [], []
+def write_store(units, seed=SEED, out_dir=OUT_DIR, mode="waveform"):
+    """
+    Streams finished units into the sharded store one row at a time,
+    then records a stratified train/val split in the manifest.
+    """
+    writer = ShardWriter(out_dir, row_shape=(MAX_TIME_STEPS, FEATURE_DIM))
+
+    for class_name, label, fname, aug_idx in units:
+        writer.append(
+            np.load(unit_path(class_name, fname, aug_idx, seed, mode)),
+            label,
+            source=os.path.join(class_name, fname),
+            aug_id=aug_idx,
+        )
+
+    y = np.array([label for _, label, _, _ in units], dtype=np.int32)
+    train_idx, val_idx = train_test_split(
+        np.arange(len(units)), test_size=0.2, stratify=y, random_state=42
+    )
+
+    writer.close(splits={"train": train_idx, "val": val_idx})
+    return len(train_idx), len(val_idx)
+
+def write_waveform_store(out_dir=WAVEFORM_DIR):
+    """
+    Online-augmentation mode: decode every raw recording once and store
+    the waveforms; features and augmentations are produced during
+    training. Train/val are split by recording.
+    """
+    writer = WaveformWriter(out_dir, sr=SAMPLE_RATE)
+    labels = []
 
-    for cls, label in [("control", 0), ("alzheimer", 1)]:
-        Xi, yi = process_class(cls, label)
-        X.extend(Xi)
-        y.extend(yi)
+    for class_name, label in CLASSES:
+        class_dir = os.path.join(RAW_DIR, class_name)
 
-    X = np.array(X, dtype=np.float32)
-    y = np.array(y, dtype=np.int32)
+        for fname in sorted(os.listdir(class_dir)):
+            if not fname.endswith(".wav"):
+                continue
 
-    X_train, X_val, y_train, y_val = train_test_split(
-        X, y, test_size=0.2, stratify=y, random_state=42
+            y_raw, _ = librosa.load(os.path.join(class_dir, fname), sr=SAMPLE_RATE)
+            writer.append(y_raw, label, source=os.path.join(class_name, fname))
+            labels.append(label)
+
+    train_idx, val_idx = train_test_split(
+        np.arange(len(labels)), test_size=0.2, stratify=labels, random_state=42
+    )
+
+    writer.close(splits={"train": train_idx, "val": val_idx})
+    return len(train_idx), len(val_idx)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the feature dataset")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="Worker processes (1 = serial)",
+    )
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument(
+        "--fresh", action="store_true",
+        help="Ignore finished units from a previous run",
+    )
+    parser.add_argument(
+        "--augment", choices=AUGMENT_MODES, default="waveform",
+        help="waveform: librosa pitch shift / time stretch; "
+             "spectral: batched mel-domain augmentation",
     )
+    parser.add_argument(
+        "--online", action="store_true",
+        help="Only store decoded waveforms for on-the-fly augmentation in training",
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.online:
+        n_train, n_val = write_waveform_store()
+        print("✅ Waveform store ready")
+        print(f"Train: {n_train} recordings, Val: {n_val} recordings → {WAVEFORM_DIR}")
+        return
+
+    units = list_work_units()
+
+    if args.fresh:
+        for class_name, _, fname, aug_idx in units:
+            path = unit_path(class_name, fname, aug_idx, args.seed, args.augment)
+            if os.path.exists(path):
+                os.remove(path)
+
+    run_units(units, workers=args.workers, seed=args.seed, mode=args.augment)
 
-    np.save(f"{OUT_DIR}/X_train.npy", X_train)
-    np.save(f"{OUT_DIR}/X_val.npy", X_val)
-    np.save(f"{OUT_DIR}/y_train.npy", y_train)
-    np.save(f"{OUT_DIR}/y_val.npy", y_val)
+    n_train, n_val = write_store(units, seed=args.seed, mode=args.augment)
 
     print("✅ Dataset ready")
-    print("Train:", X_train.shape, "Val:", X_val.shape)
+    print(f"Train: {n_train} rows, Val: {n_val} rows → {OUT_DIR}")
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -0,0 +1,282 @@
+import os
+import json
+import numpy as np
+
+
+MANIFEST_FILE = "manifest.json"
+SHARD_DIR = "shards"
+SHARD_ROWS = 4096
+
+
+class ShardWriter:
+    """
+    Appends fixed-shape feature rows to .npy shards of `shard_rows` rows.
+
+    Each shard gets a .json sidecar with the label / source file /
+    augmentation id of its rows. The manifest (shape, dtype, shard list)
+    is rewritten after every shard, so the store on disk is always
+    consistent with the shards flushed so far; close() adds the per-row
+    lists and splits to it once.
+    """
+
+    def __init__(self, out_dir, row_shape, dtype="float32", shard_rows=SHARD_ROWS):
+        self.out_dir = out_dir
+        self.row_shape = tuple(row_shape)
+        self.dtype = np.dtype(dtype)
+        self.shard_rows = shard_rows
+
+        self.shards = []
+        self.n_flushed = 0
+        self.labels = []
+        self.sources = []
+        self.aug_ids = []
+        self.splits = {}
+
+        self._buffer = np.empty((shard_rows,) + self.row_shape, dtype=self.dtype)
+        self._buffered = 0
+
+        os.makedirs(os.path.join(out_dir, SHARD_DIR), exist_ok=True)
+
+    def append(self, features, label, source="", aug_id=0):
+        if features.shape != self.row_shape:
+            raise ValueError(f"Row shape {features.shape} != {self.row_shape}")
+
+        self._buffer[self._buffered] = features
+        self._buffered += 1
+        self.labels.append(int(label))
+        self.sources.append(source)
+        self.aug_ids.append(int(aug_id))
+
+        if self._buffered == self.shard_rows:
+            self.flush()
+
+    def flush(self):
+        if self._buffered == 0:
+            return
+
+        name = f"shard_{len(self.shards):05d}"
+        path = os.path.join(self.out_dir, SHARD_DIR, name + ".npy")
+        np.save(path + ".tmp.npy", self._buffer[:self._buffered])
+        os.replace(path + ".tmp.npy", path)
+
+        # Row metadata of this shard only, so each flush costs O(shard_rows)
+        start, end = self.n_flushed, self.n_flushed + self._buffered
+        meta_path = os.path.join(self.out_dir, SHARD_DIR, name + ".json")
+        with open(meta_path + ".tmp", "w") as f:
+            f.write(json.dumps({
+                "labels": self.labels[start:end],
+                "sources": self.sources[start:end],
+                "aug_ids": self.aug_ids[start:end],
+            }))
+        os.replace(meta_path + ".tmp", meta_path)
+
+        self.shards.append({
+            "file": os.path.join(SHARD_DIR, name + ".npy"),
+            "meta": os.path.join(SHARD_DIR, name + ".json"),
+            "rows": self._buffered,
+        })
+        self.n_flushed = end
+        self._buffered = 0
+        self.write_manifest()
+
+    def write_manifest(self, rows=False):
+        """rows: also write the per-row lists and splits (once, on close)"""
+        n_rows = self.n_flushed
+        manifest = {
+            "row_shape": list(self.row_shape),
+            "dtype": self.dtype.name,
+            "n_rows": n_rows,
+            "shards": self.shards,
+        }
+        if rows:
+            manifest.update({
+                "labels": self.labels[:n_rows],
+                "sources": self.sources[:n_rows],
+                "aug_ids": self.aug_ids[:n_rows],
+                "splits": self.splits,
+            })
+
+        # json.dumps runs the C encoder; json.dump to a file does not
+        path = os.path.join(self.out_dir, MANIFEST_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(json.dumps(manifest))
+        os.replace(path + ".tmp", path)
+
+    def close(self, splits=None):
+        """splits: optional dict name -> list of row indices"""
+        if splits is not None:
+            self.splits = {name: [int(i) for i in idx] for name, idx in splits.items()}
+        self.flush()
+        self.write_manifest(rows=True)
+
+
+class ShardedArray:
+    """
+    Read-only (N, *row_shape) view over memory-mapped shards.
+
+    Indexing with an int, slice or integer array gathers only the
+    requested rows from disk; `take` returns a lazy view over a subset
+    of rows (e.g. one split). np.asarray() materializes it.
+    """
+
+    def __init__(self, shards, index=None):
+        self._shards = shards
+        self._offsets = np.cumsum([0] + [len(s) for s in shards])
+        self._index = index
+        self.row_shape = shards[0].shape[1:] if shards else ()
+        self.dtype = shards[0].dtype if shards else np.dtype("float32")
+
+    def __len__(self):
+        return int(self._offsets[-1]) if self._index is None else len(self._index)
+
+    @property
+    def shape(self):
+        return (len(self),) + tuple(self.row_shape)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def take(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        if self._index is not None:
+            indices = self._index[indices]
+        return ShardedArray(self._shards, index=indices)
+
+    def _global_rows(self, key):
+        rows = np.arange(len(self))[key]
+        return rows if self._index is None else self._index[rows]
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            rows = self[key[0]]
+            if np.isscalar(key[0]):
+                return rows[key[1:]]
+            return rows[(slice(None),) + key[1:]]
+
+        if np.isscalar(key):
+            row = int(self._global_rows(key))
+            shard = int(np.searchsorted(self._offsets, row, side="right") - 1)
+            return self._shards[shard][row - self._offsets[shard]]
+
+        rows = np.atleast_1d(self._global_rows(key))
+        out = np.empty((len(rows),) + tuple(self.row_shape), dtype=self.dtype)
+        shard_ids = np.searchsorted(self._offsets, rows, side="right") - 1
+
+        for shard in np.unique(shard_ids):
+            mask = shard_ids == shard
+            out[mask] = self._shards[shard][rows[mask] - self._offsets[shard]]
+
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[:]
+        return out.astype(dtype) if dtype is not None else out
+
+
+def load_manifest(store_dir):
+    """
+    The manifest of a store. One that was never closed has no per-row
+    lists yet; they are rebuilt from the shard sidecars.
+    """
+    with open(os.path.join(store_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    if "labels" not in manifest:
+        rows = {"labels": [], "sources": [], "aug_ids": []}
+        for shard in manifest["shards"]:
+            with open(os.path.join(store_dir, shard["meta"])) as f:
+                meta = json.load(f)
+            for key in rows:
+                rows[key] += meta[key]
+        manifest.update(rows)
+        manifest.setdefault("splits", {})
+
+    return manifest
+
+
+def open_store(store_dir):
+    """
+    Returns: ShardedArray over all rows, labels (N,) int32, manifest dict
+    """
+    manifest = load_manifest(store_dir)
+
+    shards = [
+        np.load(os.path.join(store_dir, s["file"]), mmap_mode="r")
+        for s in manifest["shards"]
+    ]
+
+    X = ShardedArray(shards)
+    y = np.array(manifest["labels"], dtype=np.int32)
+    return X, y, manifest
+
+
+WAVEFORM_FILE = "waveforms.f32"
+WAVEFORM_MANIFEST_FILE = "waveforms.json"
+
+
+class WaveformWriter:
+    """
+    Appends variable-length mono float32 waveforms to one raw file;
+    the manifest keeps offset / length / label / source per recording.
+    """
+
+    def __init__(self, out_dir, sr):
+        self.out_dir = out_dir
+        self.sr = sr
+        self.offsets = []
+        self.lengths = []
+        self.labels = []
+        self.sources = []
+        self._n_samples = 0
+
+        os.makedirs(out_dir, exist_ok=True)
+        self._file = open(os.path.join(out_dir, WAVEFORM_FILE), "wb")
+
+    def append(self, y, label, source=""):
+        y = np.ascontiguousarray(y, dtype=np.float32)
+        self._file.write(y.tobytes())
+
+        self.offsets.append(self._n_samples)
+        self.lengths.append(len(y))
+        self.labels.append(int(label))
+        self.sources.append(source)
+        self._n_samples += len(y)
+
+    def close(self, splits=None):
+        """splits: optional dict name -> list of recording indices"""
+        self._file.close()
+
+        manifest = {
+            "sr": self.sr,
+            "n_samples": self._n_samples,
+            "offsets": self.offsets,
+            "lengths": self.lengths,
+            "labels": self.labels,
+            "sources": self.sources,
+            "splits": {
+                name: [int(i) for i in idx] for name, idx in (splits or {}).items()
+            },
+        }
+
+        path = os.path.join(self.out_dir, WAVEFORM_MANIFEST_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+
+def open_waveform_store(store_dir):
+    """
+    Returns: memory-mapped float32 samples (n_samples,), manifest dict.
+    Recording i is samples[offsets[i]:offsets[i] + lengths[i]].
+    """
+    with open(os.path.join(store_dir, WAVEFORM_MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    samples = np.memmap(
+        os.path.join(store_dir, WAVEFORM_FILE),
+        dtype=np.float32,
+        mode="r",
+        shape=(manifest["n_samples"],),
+    )
+    return samples, manifest
@@ -0,0 +1,51 @@
+import numpy as np
+import tensorflow as tf
+
+
+def build_ensemble_model(models):
+    """
+    Wraps the member models into one graph.
+
+    models: dict model_id -> keras model (all sharing one input shape)
+    Outputs: one probability per member (in dict order) followed by
+    their mean, so a single call scores every branch.
+    """
+
+    members = list(models.items())
+    input_shape = members[0][1].input_shape[1:]
+
+    for model_id, model in members:
+        if model.input_shape[1:] != input_shape:
+            raise ValueError(
+                f"Ensemble input mismatch: {model_id} expects "
+                f"{model.input_shape[1:]}, not {input_shape}"
+            )
+
+    inputs = tf.keras.Input(shape=input_shape, name="ensemble_input")
+
+    # Each member is wrapped under its model_id: models saved by separate
+    # training runs all default to the name "functional", which Keras
+    # rejects as duplicate operations in one graph
+    branch_outputs = []
+    for model_id, model in members:
+        member_input = tf.keras.Input(shape=input_shape)
+        member = tf.keras.Model(member_input, model(member_input), name=f"{model_id}_member")
+        branch_outputs.append(
+            tf.keras.layers.Activation("linear", name=model_id)(member(inputs, training=False))
+        )
+    mean = tf.keras.layers.Average(name="ensemble")(branch_outputs)
+
+    return tf.keras.Model(inputs, branch_outputs + [mean], name="ensemble_model")
+
+
+def predict_ensemble(ensemble_model, member_ids, X, verbose=0):
+    """
+    Returns dict: member model_id -> probs (N,), plus "ensemble" -> mean probs.
+    """
+
+    outputs = ensemble_model.predict(X, verbose=verbose)
+    names = list(member_ids) + ["ensemble"]
+    return {
+        name: np.asarray(out).ravel()
+        for name, out in zip(names, outputs)
+    }
@@ -4,7 +4,6 @@ import json
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-import tensorflow as tf
 
 from sklearn.metrics import (
     accuracy_score,
@@ -16,10 +15,10 @@ from sklearn.metrics import (
     confusion_matrix
 )
 
-from model_gru import AttentionLayer
 from data_loader import load_dataset
+from prediction_store import PredictionStore
+from threshold_metrics import ThresholdCurve
 
-MODEL_DIR = "models"
 PLOTS_DIR = "plots"
 THRESHOLD_FILE = "thresholds/best_threshold.json"
 
@@ -40,40 +39,23 @@ def load_threshold():
 
 DECISION_THRESHOLD = load_threshold()
 
-def load_model(model_id):
-    model_path = f"{MODEL_DIR}/alz_{model_id}_final.keras"
-    
-    if not os.path.exists(model_path):
-        print(f"❌ Error: Model file {model_path} not found. Did you run train_model.py?")
-        sys.exit(1)
-
-    print(f"🔹 Loading {model_id} from {model_path}...")
-    if model_id == "gru_attention":
-        return tf.keras.models.load_model(
-            model_path,
-            custom_objects={"AttentionLayer": AttentionLayer},
-        )
-
-    return tf.keras.models.load_model(model_path)
-
-
-
 def plot_threshold_analysis(y_true, y_prob, name):
     """
     Generates the requested Threshold vs F1 & Recall Curve
     """
-    thresholds = np.arange(0.1, 0.95, 0.02)
-    precisions = []
-    recalls = []
-    f1_scores = []
-
-    for t in thresholds:
-        preds = (y_prob >= t).astype(int)
-        precisions.append(precision_score(y_true, preds, zero_division=0))
-        recalls.append(recall_score(y_true, preds, zero_division=0))
-        f1_scores.append(f1_score(y_true, preds, zero_division=0))
-
- 
+    # Exact curves: one point per distinct score in the plotted range
+    curve = ThresholdCurve(y_true, y_prob).exact()
+    in_range = (curve["thresholds"] >= 0.1) & (curve["thresholds"] < 0.95)
+
+    thresholds = curve["thresholds"][in_range][::-1]
+    precisions = curve["precision"][in_range][::-1]
+    recalls = curve["recall"][in_range][::-1]
+    f1_scores = curve["f1"][in_range][::-1]
+
+    if len(thresholds) == 0:
+        print(f"⚠️ No scores between 0.1 and 0.95 for {name}; skipping threshold curve")
+        return
+
     best_idx = np.argmax(f1_scores)
     best_t = thresholds[best_idx]
     best_f1 = f1_scores[best_idx]
@@ -138,17 +120,7 @@ def compute_metrics(y_true, y_prob):
         "roc_auc": roc_auc_score(y_true, y_prob),
         "y_pred": y_pred,
     }
-def evaluate_model(model_id, X, y):
-    model = load_model(model_id)
-    
-    if model.input_shape[-1] != X.shape[-1]:
-        print(f"❌ Shape Mismatch! Model expects {model.input_shape[-1]} features, but data has {X.shape[-1]}.")
-        print("👉 Please retrain your models using 'python train_model.py'")
-        sys.exit(1)
-
-    print(f"🧠 Predicting with {model_id}...")
-    y_prob = model.predict(X, verbose=1).ravel()
-
+def evaluate_model(model_id, y, y_prob):
     metrics = compute_metrics(y, y_prob)
 
     print(f"\n✅ RESULTS — {model_id.upper()}")
@@ -164,21 +136,7 @@ def evaluate_model(model_id, X, y):
     plot_threshold_analysis(y, y_prob, model_id)
     return y_prob
 
-def evaluate_ensemble(X, y):
-    print("👥 Loading Ensemble Models...")
-    cnn = load_model("cnn_lstm")
-    gru = load_model("gru_attention")
-
-    if cnn.input_shape[-1] != X.shape[-1]:
-        print(f"❌ Shape Mismatch! Data has {X.shape[-1]} features.")
-        sys.exit(1)
-
-    print("🧠 Computing Ensemble Predictions...")
-    pred_cnn = cnn.predict(X, verbose=1).ravel()
-    pred_gru = gru.predict(X, verbose=1).ravel()
-    
-    prob = (pred_cnn + pred_gru) / 2
-
+def evaluate_ensemble(y, prob):
     metrics = compute_metrics(y, prob)
 
     print("\n✅ RESULTS — ENSEMBLE")
@@ -193,22 +151,35 @@ def evaluate_ensemble(X, y):
     plot_confusion(y, metrics["y_pred"], "ensemble")
     plot_threshold_analysis(y, prob, "ensemble") 
 
-def main():
-    if len(sys.argv) < 2:
+def main(argv=None):
+    global DECISION_THRESHOLD
+
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 1:
         print("Usage: python evaluate_models_multi.py <cnn_lstm|gru_attention|ensemble>")
         sys.exit(1)
 
-    model_id = sys.argv[1]
+    model_id = argv[0]
+    # Re-read: the threshold may have been rewritten since import (pipeline workers)
+    DECISION_THRESHOLD = load_threshold()
 
     print("📂 Loading validation/test dataset...")
-    _, _, X_test, y_test = load_dataset() 
+    _, _, X_test, y_test = load_dataset(test_only=True)
     
     print(f"🔍 Data Shape: {X_test.shape}")
-    
+
+    # Cached per-sample scores; models are only loaded when one changed
+    try:
+        y_prob = PredictionStore(X_test, y_test).probabilities([model_id])[model_id]
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        print("👉 Please retrain your models using 'python train_model.py'")
+        sys.exit(1)
+
     if model_id == "ensemble":
-        evaluate_ensemble(X_test, y_test)
+        evaluate_ensemble(y_test, y_prob)
     else:
-        evaluate_model(model_id, X_test, y_test)
+        evaluate_model(model_id, y_test, y_prob)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", 256))
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "")
+
+
+def make_cache_key(audio_digest, params):
+    """
+    audio_digest: sha256 hex digest of the raw audio bytes
+    params: preprocessing/MFCC settings that affect the features
+    """
+    params_text = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(f"{audio_digest}:{params_text}".encode()).hexdigest()
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FeatureCache:
+    """
+    Content-addressed cache of (fused features, prosody vector).
+
+    In-memory LRU of `max_entries` items, backed by an optional on-disk
+    tier of .npz files under `disk_dir` (disabled when empty).
+    """
+
+    def __init__(self, max_entries=FEATURE_CACHE_SIZE, disk_dir=FEATURE_CACHE_DIR):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            try:
+                with np.load(self._disk_path(key)) as data:
+                    entry = (data["features"], data["prosody"])
+            except Exception:
+                entry = None
+
+            if entry is not None:
+                self._remember(key, entry)
+                with self._lock:
+                    self.disk_hits += 1
+                return entry
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, features, prosody):
+        entry = (features, prosody)
+        self._remember(key, entry)
+
+        if self.disk_dir:
+            # The disk tier is best effort: a failed write only costs a recompute
+            try:
+                self._write_disk(key, features, prosody)
+            except Exception as e:
+                print(f"⚠️ Warning: Feature cache write failed for {key[:12]}: {e}")
+
+    def _write_disk(self, key, features, prosody):
+        # Unique temp file per writer: threads putting the same key must
+        # not replace (and remove) each other's half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp.npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, features=features, prosody=prosody)
+            os.replace(tmp_path, self._disk_path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_dir": self.disk_dir or None,
+            }
+
+
+FEATURE_CACHE = FeatureCache()
@@ -0,0 +1,156 @@
+import numpy as np
+import librosa
+import scipy.fft
+
+
+TIME_STEPS = 300
+N_MFCC = 40
+PROSODY_DIM = 7
+FEATURE_DIM = N_MFCC + PROSODY_DIM
+
+MFCC_PARAMS = {
+    "n_mfcc": N_MFCC,
+    "n_fft": 1024,
+    "hop_length": 512,
+}
+N_MELS = 128
+TOP_DB = 80.0
+AMIN = 1e-10
+
+# Waveforms are stacked for one STFT call up to this many samples in total
+# (4 min at 16 kHz), and only with signals at least BUCKET_FILL of the longest
+BATCH_MAX_SAMPLES = 16000 * 240
+BUCKET_FILL = 0.8
+
+
+def n_frames(n_samples, hop_length=MFCC_PARAMS["hop_length"]):
+    """Frames librosa produces for a centred STFT of n_samples"""
+    return 1 + n_samples // hop_length
+
+
+def length_buckets(lengths, max_samples=BATCH_MAX_SAMPLES, fill=BUCKET_FILL):
+    """
+    Groups indices into buckets of similar length (longest first) so each
+    bucket can be zero-padded into one stacked array without much waste.
+    """
+    order = np.argsort(lengths, kind="stable")[::-1]
+    buckets = []
+    current = []
+
+    for i in order:
+        if current:
+            longest = lengths[current[0]]
+            full = (len(current) + 1) * longest > max_samples
+            if full or lengths[i] < fill * longest:
+                buckets.append(current)
+                current = []
+        current.append(int(i))
+
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def power_to_db_batch(mel, peak_db=None):
+    """
+    librosa.power_to_db(ref=1.0, top_db=80) over a (B, n_mels, T) stack,
+    with the top_db floor taken per sample rather than over the stack.
+    peak_db (B,) raises the floor reference when frames were cropped.
+    """
+    mel_db = 10.0 * np.log10(np.maximum(AMIN, mel))
+    peak = mel_db.max(axis=(1, 2))
+    if peak_db is not None:
+        peak = np.maximum(peak, peak_db)
+    np.maximum(mel_db, (peak - TOP_DB)[:, None, None], out=mel_db)
+    return mel_db
+
+
+def mfcc_from_db(mel_db, max_frames=None):
+    """(B, n_mels, T) log-mel -> (B, N_MFCC, T) MFCCs, as librosa.feature.mfcc"""
+    if max_frames is not None:
+        mel_db = mel_db[:, :, :max_frames]
+    return scipy.fft.dct(mel_db, axis=1, type=2, norm="ortho")[:, :N_MFCC, :]
+
+
+def _stack(waveforms, idx):
+    if len(idx) == 1:
+        return np.asarray(waveforms[idx[0]])[np.newaxis, :]
+
+    longest = max(len(waveforms[i]) for i in idx)
+    dtype = np.result_type(*[waveforms[i] for i in idx])
+    Y = np.zeros((len(idx), longest), dtype=dtype)
+    for row, i in enumerate(idx):
+        Y[row, :len(waveforms[i])] = waveforms[i]
+    return Y
+
+
+def iter_mfcc_batches(waveforms, sr, max_frames=None):
+    """
+    Yields (indices, mfcc (B, N_MFCC, T), frames (B,)) per length bucket.
+
+    Zero padding is exact here: the centred STFT already pads with zeros,
+    so the first n_frames(len) frames of a padded signal equal those of
+    the original, and padded frames carry no power.
+    """
+    lengths = np.array([len(y) for y in waveforms], dtype=np.int64)
+
+    for idx in length_buckets(lengths):
+        mel = librosa.feature.melspectrogram(
+            y=_stack(waveforms, idx),
+            sr=sr,
+            n_fft=MFCC_PARAMS["n_fft"],
+            hop_length=MFCC_PARAMS["hop_length"],
+            n_mels=N_MELS,
+        )
+        mfcc = mfcc_from_db(power_to_db_batch(mel), max_frames)
+        yield idx, mfcc, n_frames(lengths[idx])
+
+
+def mfcc_batch(waveforms, sr):
+    """Full-length (T_i, N_MFCC) MFCC sequence per waveform"""
+    out = [None] * len(waveforms)
+    for idx, mfcc, frames in iter_mfcc_batches(waveforms, sr):
+        for row, i in enumerate(idx):
+            out[i] = mfcc[row, :, :frames[row]].T
+    return out
+
+
+def write_feature_rows(out, mfcc, frames, prosody, rows=None):
+    """
+    out: (N, TIME_STEPS, FEATURE_DIM) destination
+    mfcc: (B, N_MFCC, T); frames: valid frames per input; prosody: (B, PROSODY_DIM)
+    rows: destination row in `out` per input (default 0..B-1)
+
+    MFCCs are truncated / zero-padded to TIME_STEPS and prosody is
+    broadcast along time, written in place.
+    """
+    rows = range(len(mfcc)) if rows is None else rows
+    for b, i in enumerate(rows):
+        t = min(int(frames[b]), TIME_STEPS)
+        out[i, :t, :N_MFCC] = mfcc[b, :, :t].T
+        out[i, t:, :N_MFCC] = 0.0
+        out[i, :, N_MFCC:] = prosody[b]
+    return out
+
+
+def extract_features_batch(waveforms, prosody, sr, out=None):
+    """
+    Feature rows for many preprocessed waveforms at once.
+
+    waveforms: list of 1-D arrays at `sr` (e.g. y_speech from preprocess_audio)
+    prosody: (N, PROSODY_DIM)
+    out: optional preallocated (N, TIME_STEPS, FEATURE_DIM) float32 buffer
+
+    Returns: out, each row identical to the per-file librosa MFCC path
+    """
+    prosody = np.asarray(prosody, dtype=np.float32).reshape(len(waveforms), PROSODY_DIM)
+
+    if out is None:
+        out = np.empty((len(waveforms), TIME_STEPS, FEATURE_DIM), dtype=np.float32)
+    elif out.shape != (len(waveforms), TIME_STEPS, FEATURE_DIM):
+        raise ValueError(f"Output buffer shape {out.shape} != {(len(waveforms), TIME_STEPS, FEATURE_DIM)}")
+
+    for idx, mfcc, frames in iter_mfcc_batches(waveforms, sr, max_frames=TIME_STEPS):
+        write_feature_rows(out, mfcc, frames, prosody[idx], rows=idx)
+
+    return out
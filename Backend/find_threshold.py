@@ -1,13 +1,10 @@
 import os
 import json
-import numpy as np
-import tensorflow as tf
-from sklearn.metrics import f1_score
 
-from model_gru import AttentionLayer
 from data_loader import load_dataset
+from prediction_store import PredictionStore
+from threshold_metrics import best_f1_threshold, THRESHOLD_RANGE
 
-MODEL_DIR = "models"
 THRESHOLD_DIR = "thresholds"
 THRESHOLD_FILE = os.path.join(THRESHOLD_DIR, "best_threshold.json")
 
@@ -16,65 +13,28 @@ EXPECTED_FEATURE_DIM = 47
 os.makedirs(THRESHOLD_DIR, exist_ok=True)
 
 
-def load_model(model_id):
-    model_path = f"{MODEL_DIR}/alz_{model_id}_final.keras"
-
-    if model_id == "gru_attention":
-        return tf.keras.models.load_model(
-            model_path,
-            custom_objects={"AttentionLayer": AttentionLayer},
-        )
-
-    return tf.keras.models.load_model(model_path)
-
-
-def validate_shapes(model, X):
+def validate_shapes(X):
     if X.shape[2] != EXPECTED_FEATURE_DIM:
         raise ValueError(
             f"❌ Data feature mismatch: {X.shape[2]} != {EXPECTED_FEATURE_DIM}"
         )
 
-    if model.input_shape[2] != X.shape[2]:
-        raise ValueError(
-            f"❌ Model expects {model.input_shape[2]} features, "
-            f"but data has {X.shape[2]}"
-        )
-
 
 def find_best_threshold():
     print("📂 Loading validation dataset...")
-    _, _, X_val, y_val = load_dataset()
-
-    models = {
-        "cnn_lstm": load_model("cnn_lstm"),
-        "gru_attention": load_model("gru_attention"),
-    }
-
-    for m in models.values():
-        validate_shapes(m, X_val)
+    _, _, X_val, y_val = load_dataset(test_only=True)
+    validate_shapes(X_val)
 
-    print("🔮 Running ensemble predictions once...")
-    preds = []
-    for model in models.values():
-        preds.append(model.predict(X_val).ravel())
-
-    ensemble_prob = np.mean(preds, axis=0)
-
-    thresholds = np.arange(0.1, 0.9, 0.01)
-    best_threshold = 0.5
-    best_f1 = 0.0
+    # Scores are only recomputed when a model file or the split changed
+    store = PredictionStore(X_val, y_val)
+    ensemble_prob = store.probabilities(["ensemble"])["ensemble"]
 
     print("🔍 Searching for optimal threshold...")
 
-    for t in thresholds:
-        y_pred = (ensemble_prob >= t).astype(int)
-        f1 = f1_score(y_val, y_pred)
-
-        if f1 > best_f1:
-            best_f1 = f1
-            best_threshold = float(t)
+    # Every distinct score in THRESHOLD_RANGE is a candidate, not a 0.01 grid
+    best_threshold, best_f1 = best_f1_threshold(y_val, ensemble_prob, THRESHOLD_RANGE)
 
-    print(f"✅ Best Threshold Found: {best_threshold:.2f}")
+    print(f"✅ Best Threshold Found: {best_threshold:.4f}")
     print(f"🏆 Best F1-score     : {best_f1:.4f}")
 
     with open(THRESHOLD_FILE, "w") as f:
@@ -1,15 +1,44 @@
 import os
 import json
+import hashlib
 import numpy as np
-import tensorflow as tf
-import librosa
 
-from audio_preprocessing import preprocess_audio
-from model_gru import AttentionLayer
+from audio_preprocessing import (
+    preprocess_audio,
+    preprocess_waveform,
+    timed,
+    DEFAULT_NORMALIZATION,
+)
+from audio_stream import decode_stream, STREAM_MAX_SECONDS, LONG_MODE_MAX_SECONDS
+from model_registry import ModelRegistry, ENSEMBLE_ID
+from feature_cache import FEATURE_CACHE, make_cache_key, file_digest
+from features import (
+    TIME_STEPS,
+    FEATURE_DIM,
+    MFCC_PARAMS,
+    mfcc_batch,
+    extract_features_batch,
+    write_feature_rows,
+)
 
 
-TIME_STEPS = 300
-FEATURE_DIM = 47  
+# Everything that changes the fused features; part of the feature cache key
+PREPROCESS_PARAMS = {
+    "sr": 16000,
+    "vad_top_db": 30,
+    "min_pause_sec": 0.15,
+    "f0_method": os.getenv("F0_METHOD", "pyin"),
+    # Which spans of long recordings get analysed (see select_analysis_segments)
+    "window_policy": os.getenv("ANALYSIS_WINDOW", "full"),
+    "window_sec": float(os.getenv("ANALYSIS_WINDOW_SEC", 20)),
+    "n_windows": int(os.getenv("ANALYSIS_N_WINDOWS", 3)),
+    # "frame" (hop-aware gain) needs models retrained on it
+    "normalization": os.getenv("NORMALIZATION", DEFAULT_NORMALIZATION),
+}
+
+# Long-recording mode: 300-frame windows every WINDOW_HOP_FRAMES frames
+WINDOW_HOP_FRAMES = int(os.getenv("WINDOW_HOP_FRAMES", 150))
+AGGREGATION_METHODS = ("mean", "max", "attention")
 MODEL_DIR = "models"
 THRESHOLD_FILE = "thresholds/best_threshold.json"
 
@@ -26,25 +55,8 @@ def load_best_threshold():
 
 DECISION_THRESHOLD = load_best_threshold()
 
-MODELS = {}
-
-
-try:
-    cnn_path = os.path.join(MODEL_DIR, "alz_cnn_lstm_final.keras")
-    if os.path.exists(cnn_path):
-        MODELS["cnn_lstm"] = tf.keras.models.load_model(cnn_path)
-except Exception as e:
-    print(f"⚠️ Warning: Could not load CNN-LSTM: {e}")
-
-try:
-    gru_path = os.path.join(MODEL_DIR, "alz_gru_attention_final.keras")
-    if os.path.exists(gru_path):
-        MODELS["gru_attention"] = tf.keras.models.load_model(
-            gru_path,
-            custom_objects={"AttentionLayer": AttentionLayer},
-        )
-except Exception as e:
-    print(f"⚠️ Warning: Could not load GRU-Attention: {e}")
+# Models are discovered now but loaded on first use (see model_registry)
+REGISTRY = ModelRegistry(MODEL_DIR, time_steps=TIME_STEPS, feature_dim=FEATURE_DIM)
 
 
 MODEL_ID_MAP = {
@@ -54,65 +66,254 @@ MODEL_ID_MAP = {
     "gru_attention": "gru_attention",
 }
 
-def extract_fused_features(file_path):
+def fuse_features(y, sr, prosody, long_mode=False):
     """
-    Returns: X (1, 300, 47), prosody (7,)
+    Returns: X (1, 300, 47), or (W, 300, 47) overlapping windows when long_mode
     """
-  
-    y, sr, prosody = preprocess_audio(file_path)
-
-    mfcc = librosa.feature.mfcc(
-        y=y,
-        sr=sr,
-        n_mfcc=40,
-        n_fft=1024,
-        hop_length=512
-    ).T
 
+    if not long_mode:
+        return extract_features_batch([y], prosody[np.newaxis, :], sr)
 
+    mfcc = mfcc_batch([y], sr)[0]
     if mfcc.shape[0] > TIME_STEPS:
-        mfcc = mfcc[:TIME_STEPS]
-    else:
-        pad_width = TIME_STEPS - mfcc.shape[0]
-        mfcc = np.pad(mfcc, ((0, pad_width), (0, 0)))
+        return fuse_windowed_features(mfcc, prosody)
+
+    X = np.empty((1, TIME_STEPS, FEATURE_DIM), dtype=np.float32)
+    return write_feature_rows(X, mfcc.T[np.newaxis], [mfcc.shape[0]], prosody[np.newaxis, :])
+
+
+def fuse_windowed_features(mfcc, prosody, hop_frames=WINDOW_HOP_FRAMES):
+    """
+    Splits an (T, 40) MFCC sequence (T > 300) into overlapping 300-frame
+    windows; the last window is aligned to the end so no frames are lost.
+
+    Returns: X (W, 300, 47)
+    """
+
+    starts = list(range(0, mfcc.shape[0] - TIME_STEPS + 1, hop_frames))
+    if starts[-1] != mfcc.shape[0] - TIME_STEPS:
+        starts.append(mfcc.shape[0] - TIME_STEPS)
+
+    n_mfcc = mfcc.shape[1]
+    X = np.empty((len(starts), TIME_STEPS, n_mfcc + len(prosody)), dtype=np.float32)
+    X[:, :, :n_mfcc] = np.lib.stride_tricks.sliding_window_view(
+        mfcc, TIME_STEPS, axis=0
+    )[starts].transpose(0, 2, 1)
+    X[:, :, n_mfcc:] = prosody
+
+    return X
+
+
+def aggregate_probabilities(probs, method="mean"):
+    """
+    Combines per-window probabilities into one score.
+
+    mean     : average over windows
+    max      : most Alzheimer-like window
+    attention: softmax over |logit|, so confident windows weigh more
+    """
+
+    probs = np.asarray(probs, dtype=np.float64)
+
+    if method == "mean":
+        return float(np.mean(probs))
+
+    if method == "max":
+        return float(np.max(probs))
+
+    if method == "attention":
+        p = np.clip(probs, 1e-6, 1 - 1e-6)
+        confidence = np.abs(np.log(p / (1 - p)))
+        weights = np.exp(confidence - confidence.max())
+        weights /= weights.sum()
+        return float(np.sum(weights * probs))
+
+    raise ValueError(
+        f"Unknown aggregation '{method}'. Expected one of {AGGREGATION_METHODS}"
+    )
+
+
+def extract_fused_features(file_path, long_mode=False, timings=None):
+    """
+    Returns: X (1, 300, 47) or (W, 300, 47) when long_mode, prosody (7,)
+    timings: optional dict that receives per-stage wall times in ms
+    """
+
+    y, sr, prosody = preprocess_audio(file_path, **PREPROCESS_PARAMS, timings=timings)
+    with timed(timings, "mfcc"):
+        X = fuse_features(y, sr, prosody, long_mode=long_mode)
+    return X, prosody
+
+
+def extract_waveform_features(y, sr, long_mode=False, timings=None):
+    """
+    extract_fused_features for an already decoded waveform at PREPROCESS_PARAMS["sr"].
+    """
+
+    params = {k: v for k, v in PREPROCESS_PARAMS.items() if k != "sr"}
+    y, sr, prosody = preprocess_waveform(y, sr, **params, timings=timings)
+    with timed(timings, "mfcc"):
+        X = fuse_features(y, sr, prosody, long_mode=long_mode)
+    return X, prosody
+
+
+def feature_cache_key(audio_digest, **extra_params):
+    return make_cache_key(
+        audio_digest,
+        {**PREPROCESS_PARAMS, **MFCC_PARAMS, "time_steps": TIME_STEPS, **extra_params},
+    )
 
-    prosody_rep = np.tile(prosody, (TIME_STEPS, 1))
 
-    features = np.hstack([mfcc, prosody_rep]).astype(np.float32)
-    
-    return features[np.newaxis, ...], prosody
+def _long_mode_params(long_mode):
+    return {"long_mode": True, "window_hop_frames": WINDOW_HOP_FRAMES} if long_mode else {}
+
+
+def get_fused_features(file_path, long_mode=False, timings=None):
+    """
+    extract_fused_features behind the content-addressed FEATURE_CACHE,
+    so re-submitting a recording only costs the forward pass.
+    """
+
+    with timed(timings, "feature_cache"):
+        key = feature_cache_key(file_digest(file_path), **_long_mode_params(long_mode))
+        cached = FEATURE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    X, prosody = extract_fused_features(file_path, long_mode=long_mode, timings=timings)
+    FEATURE_CACHE.put(key, X, prosody)
+    return X, prosody
+
+
+def get_stream_features(fileobj, long_mode=False, timings=None):
+    """
+    Decodes an upload stream in memory (at most STREAM_MAX_SECONDS, or
+    LONG_MODE_MAX_SECONDS in long_mode) and extracts features, cached on
+    a digest of the decoded samples.
+
+    Returns: X, prosody, stream (analysed_seconds, truncated)
+    """
+
+    max_seconds = LONG_MODE_MAX_SECONDS if long_mode else STREAM_MAX_SECONDS
+    if PREPROCESS_PARAMS["window_policy"] == "first":
+        max_seconds = min(max_seconds, PREPROCESS_PARAMS["window_sec"])
+
+    with timed(timings, "decode"):
+        y, sr, truncated = decode_stream(fileobj, sr=PREPROCESS_PARAMS["sr"], max_seconds=max_seconds)
+
+    stream = {"analysed_seconds": round(len(y) / sr, 2), "truncated": truncated}
+
+    with timed(timings, "feature_cache"):
+        digest = hashlib.sha256(y.tobytes()).hexdigest()
+        key = feature_cache_key(
+            digest, stream_max_seconds=max_seconds, **_long_mode_params(long_mode)
+        )
+        cached = FEATURE_CACHE.get(key)
+    if cached is not None:
+        return (*cached, stream)
+
+    X, prosody = extract_waveform_features(y, sr, long_mode=long_mode, timings=timings)
+    FEATURE_CACHE.put(key, X, prosody)
+    return X, prosody, stream
 
 
 def predict_file(
     file_path: str,
     model_id: str = "gru_attention", 
     use_ensemble: bool = False,
+    long_mode: bool = False,
+    aggregate: str = "mean",
+):
+    timings = {}
+    X, prosody = get_fused_features(file_path, long_mode=long_mode, timings=timings)
+    with timed(timings, "inference"):
+        result = score_features(
+            X,
+            prosody,
+            model_id=model_id,
+            use_ensemble=use_ensemble,
+            aggregate=aggregate if long_mode else None,
+        )
+    return with_timings(result, timings)
+
+
+def predict_stream(
+    fileobj,
+    model_id: str = "gru_attention",
+    use_ensemble: bool = False,
+    long_mode: bool = False,
+    aggregate: str = "mean",
 ):
-    X, prosody = extract_fused_features(file_path)
+    timings = {}
+    X, prosody, stream = get_stream_features(fileobj, long_mode=long_mode, timings=timings)
+    with timed(timings, "inference"):
+        result = score_features(
+            X,
+            prosody,
+            model_id=model_id,
+            use_ensemble=use_ensemble,
+            aggregate=aggregate if long_mode else None,
+        )
+    if "error" not in result:
+        # Audio past the decode cap is not scored; say so instead of hiding it
+        result.update(stream)
+    return with_timings(result, timings)
+
+
+def with_timings(result, timings):
+    """Per-stage wall times (ms) of this request; stages skipped on a cache hit are absent"""
+    if "error" not in result:
+        result["timings_ms"] = {stage: round(ms, 2) for stage, ms in timings.items()}
+    return result
+
+
+def score_features(X, prosody, model_id="gru_attention", use_ensemble=False, aggregate=None):
+    """
+    X: (W, 300, 47). A single window goes through the micro-batcher;
+    several windows run as one batched forward pass and are combined
+    with `aggregate` (mean / max / attention).
+    """
 
     if X.shape[-1] != FEATURE_DIM:
         raise ValueError(f"Feature mismatch! Expected {FEATURE_DIM}, got {X.shape[-1]}")
 
-    prob = 0.0
-    
-    if use_ensemble and len(MODELS) > 1:
-        probs = [float(m.predict(X, verbose=0)[0][0]) for m in MODELS.values()]
-        prob = float(np.mean(probs))
+    if aggregate is not None and aggregate not in AGGREGATION_METHODS:
+        return {"error": f"Unknown aggregation '{aggregate}'. Use one of {AGGREGATION_METHODS}."}
+
+    if use_ensemble and ENSEMBLE_ID in REGISTRY.entries:
+        run_id = ENSEMBLE_ID
         used_model = "Ensemble"
 
     else:
       
-        real_id = MODEL_ID_MAP.get(model_id, "gru_attention")
+        run_id = MODEL_ID_MAP.get(model_id, "gru_attention")
         
-        if real_id not in MODELS:
-            return {"error": f"Model {real_id} not loaded. Check 'models/' folder."}
-            
-        prob = float(MODELS[real_id].predict(X, verbose=0)[0][0])
-        used_model = real_id
+        if run_id not in REGISTRY.entries:
+            return {"error": f"Model {run_id} not found. Check 'models/' folder."}
+
+        used_model = run_id
+
+    # Held for the forward pass so a concurrent eviction cannot unload it
+    with REGISTRY.use(run_id) as entry:
+        # out: (W, 1), or (W, members + 1) for the fused ensemble
+        if len(X) == 1:
+            out = entry.batcher.predict(X[0])[np.newaxis, :]
+        else:
+            out = entry.predict_fn(X)
+
+    window_probs = out[:, -1]
+    prob = aggregate_probabilities(window_probs, aggregate or "mean")
+
+    member_probs = None
+    if entry.members:
+        member_probs = {
+            member_id: round(aggregate_probabilities(out[:, i], aggregate or "mean"), 4)
+            for i, member_id in enumerate(entry.members)
+        }
 
     label = "Alzheimer" if prob >= DECISION_THRESHOLD else "Control"
 
-    return {
+    result = {
         "prediction": label,
         "probability": round(prob, 4),
         "threshold_used": DECISION_THRESHOLD,
@@ -125,6 +326,15 @@ def predict_file(
         }
     }
 
+    if member_probs is not None:
+        result["member_probabilities"] = member_probs
+
+    if aggregate is not None:
+        result["aggregation"] = aggregate
+        result["window_probabilities"] = [round(float(p), 4) for p in window_probs]
+
+    return result
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1:
@@ -0,0 +1,66 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", os.cpu_count() or 1))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", INFERENCE_WORKERS * 4))
+
+
+class ExecutorSaturated(RuntimeError):
+    pass
+
+
+class InferenceExecutor:
+    """
+    Bounded worker pool for CPU-heavy inference jobs.
+
+    Runs at most `max_workers` jobs at once and accepts at most
+    `max_queue` further jobs waiting for a worker. Submitting past
+    that limit raises ExecutorSaturated instead of queueing forever.
+    """
+
+    def __init__(self, max_workers=INFERENCE_WORKERS, max_queue=INFERENCE_MAX_QUEUE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="inference",
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorSaturated(
+                f"Inference queue full ({self.max_workers} running, "
+                f"{self.max_queue} waiting)"
+            )
+
+        with self._lock:
+            self._in_flight += 1
+
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+INFERENCE_EXECUTOR = InferenceExecutor()
@@ -0,0 +1,307 @@
+import os
+import re
+import glob
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from batching import MicroBatcher
+
+
+MODEL_DIR = "models"
+MODEL_FILE_PATTERN = re.compile(r"^alz_(.+)_final\.keras$")
+
+# 0 = no budget; otherwise least-recently-used models are evicted past it
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", 0))
+PRELOAD_MODELS = [m for m in os.getenv("PRELOAD_MODELS", "").split(",") if m]
+
+ENSEMBLE_ID = "ensemble"
+ENSEMBLE_MEMBERS = ["cnn_lstm", "gru_attention"]
+
+
+def compile_model(model, time_steps, feature_dim):
+    """
+    Traces model into a tf.function with a fixed (None, time_steps, feature_dim)
+    float32 signature and warms it, so the hot path skips Keras' predict machinery.
+    """
+    import tensorflow as tf
+
+    @tf.function(
+        input_signature=[
+            tf.TensorSpec(shape=(None, time_steps, feature_dim), dtype=tf.float32)
+        ]
+    )
+    def serve(X):
+        return model(X, training=False)
+
+    serve(tf.zeros((1, time_steps, feature_dim), dtype=tf.float32))
+    return serve
+
+
+def compiled_predict_fn(serve):
+    import tensorflow as tf
+
+    def predict(X):
+        out = serve(tf.convert_to_tensor(X, dtype=tf.float32))
+        if isinstance(out, (list, tuple)):
+            return np.concatenate([o.numpy() for o in out], axis=1)
+        return out.numpy()
+
+    return predict
+
+
+def load_keras_model(path):
+    import tensorflow as tf
+    from model_gru import AttentionLayer
+
+    return tf.keras.models.load_model(
+        path,
+        custom_objects={"AttentionLayer": AttentionLayer},
+    )
+
+
+def model_memory_bytes(model):
+    return int(sum(w.numpy().nbytes for w in model.weights))
+
+
+class ModelEntry:
+    def __init__(self, model_id, path=None, members=None):
+        self.model_id = model_id
+        self.path = path
+        self.members = members or []
+        self.model = None
+        self.predict_fn = None
+        self.batcher = None
+        self.load_time = None
+        self.memory_bytes = 0
+        self.last_used = None
+        # Requests currently scoring with this entry; unloads wait for 0
+        self.in_use = 0
+        self.unload_pending = False
+        # Serializes loads of this entry only; the registry lock is not
+        # held while a model loads
+        self.load_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def unload(self):
+        if self.batcher is not None:
+            self.batcher.stop()
+        self.model = None
+        self.predict_fn = None
+        self.batcher = None
+        self.memory_bytes = 0
+        self.unload_pending = False
+
+    def status(self):
+        return {
+            "model_id": self.model_id,
+            "path": self.path,
+            "members": self.members or None,
+            "loaded": self.loaded,
+            "load_time_sec": round(self.load_time, 3) if self.load_time else None,
+            "memory_mb": round(self.memory_bytes / 2 ** 20, 2),
+            "last_used": self.last_used,
+            "in_use": self.in_use,
+        }
+
+
+class ModelRegistry:
+    """
+    Discovers alz_<id>_final.keras files under `model_dir` without
+    loading them. Each model (and TensorFlow itself) is loaded on first
+    use, compiled and given a MicroBatcher.
+
+    When `memory_budget_mb` is set, least-recently-used models are
+    unloaded to stay under it. The "ensemble" entry is the fused graph
+    of its members; it shares their weights and is dropped with them.
+
+    Score through `use()`: entries held by a request are never evicted,
+    and an explicit unload() of one waits until the last holder is done.
+    Loading runs outside the registry lock, so requests for resident
+    models never wait on another model's load.
+    """
+
+    def __init__(
+        self,
+        model_dir=MODEL_DIR,
+        time_steps=300,
+        feature_dim=47,
+        memory_budget_mb=MODEL_MEMORY_BUDGET_MB,
+    ):
+        self.model_dir = model_dir
+        self.time_steps = time_steps
+        self.feature_dim = feature_dim
+        self.memory_budget = memory_budget_mb * 2 ** 20
+        self._lock = threading.RLock()
+        self._lru = OrderedDict()
+        self.entries = {}
+        self.discover()
+
+    def discover(self):
+        with self._lock:
+            for path in sorted(glob.glob(os.path.join(self.model_dir, "*.keras"))):
+                match = MODEL_FILE_PATTERN.match(os.path.basename(path))
+                if match and match.group(1) not in self.entries:
+                    self.entries[match.group(1)] = ModelEntry(match.group(1), path)
+
+            members = [m for m in ENSEMBLE_MEMBERS if m in self.entries]
+            if len(members) > 1 and ENSEMBLE_ID not in self.entries:
+                self.entries[ENSEMBLE_ID] = ModelEntry(ENSEMBLE_ID, members=members)
+
+        return self.available_ids()
+
+    def available_ids(self):
+        return list(self.entries.keys())
+
+    def preload(self, model_ids=None):
+        for model_id in (PRELOAD_MODELS if model_ids is None else model_ids):
+            if model_id in self.entries:
+                self.get(model_id)
+            else:
+                print(f"⚠️ Warning: Cannot preload unknown model '{model_id}'")
+
+    def get(self, model_id):
+        """Loads model_id if needed and returns its entry, without holding it"""
+        with self.use(model_id) as entry:
+            return entry
+
+    @contextmanager
+    def use(self, model_id):
+        """get(), with the entry (and its members) held loaded until the block exits"""
+        held = self._hold(model_id)
+        try:
+            yield held[0]
+        finally:
+            self._release(held)
+
+    def _hold(self, model_id):
+        if model_id not in self.entries:
+            raise KeyError(f"Model {model_id} not found in '{self.model_dir}'")
+
+        entry = self.entries[model_id]
+        held = []
+        try:
+            # Held members cannot be evicted while the ensemble is built
+            for member_id in entry.members:
+                held += self._hold(member_id)
+            self._hold_loaded(entry)
+        except BaseException:
+            self._release(held)
+            raise
+
+        return [entry] + held
+
+    def _hold_loaded(self, entry):
+        with self._lock:
+            if entry.loaded:
+                self._touch(entry)
+                return
+
+        # One thread loads; others asking for this model wait here only
+        with entry.load_lock:
+            with self._lock:
+                if entry.loaded:
+                    self._touch(entry)
+                    return
+
+            model, memory_bytes, predict_fn, load_time = self._load(entry)
+
+            with self._lock:
+                self._evict_for(memory_bytes, keep=entry.model_id)
+                entry.model = model
+                entry.memory_bytes = memory_bytes
+                entry.predict_fn = predict_fn
+                entry.batcher = MicroBatcher(predict_fn, name=f"batcher-{entry.model_id}")
+                entry.load_time = load_time
+                self._touch(entry)
+
+        print(f"🔹 Loaded {entry.model_id} in {load_time:.2f}s")
+
+    def _touch(self, entry):
+        """Holds a loaded entry and marks it most recently used (registry lock held)"""
+        entry.in_use += 1
+        entry.last_used = time.time()
+        entry.unload_pending = False
+        self._lru[entry.model_id] = entry
+        self._lru.move_to_end(entry.model_id)
+
+    def _release(self, held):
+        with self._lock:
+            for e in held:
+                e.in_use -= 1
+            for e in held:
+                if e.unload_pending and not e.in_use:
+                    self.unload(e.model_id)
+
+    def _load(self, entry):
+        """Builds and compiles the model; runs without the registry lock"""
+        start = time.perf_counter()
+
+        if entry.members:
+            from ensemble import build_ensemble_model
+
+            model = build_ensemble_model(
+                {m: self.entries[m].model for m in entry.members}
+            )
+            memory_bytes = 0
+        else:
+            model = load_keras_model(entry.path)
+            memory_bytes = model_memory_bytes(model)
+
+        serve = compile_model(model, self.time_steps, self.feature_dim)
+        return model, memory_bytes, compiled_predict_fn(serve), time.perf_counter() - start
+
+    def loaded_bytes(self):
+        return sum(e.memory_bytes for e in self.entries.values() if e.loaded)
+
+    def _evict_for(self, new_bytes, keep):
+        if not self.memory_budget:
+            return
+
+        protected = {keep}
+        protected.update(e.model_id for e in self.entries.values() if e.in_use)
+        protected.update(
+            e.model_id for e in self.entries.values() if keep in e.members
+        )
+
+        for model_id in list(self._lru.keys()):
+            if self.loaded_bytes() + new_bytes <= self.memory_budget:
+                break
+            if model_id in protected:
+                continue
+            self.unload(model_id)
+
+    def unload(self, model_id):
+        with self._lock:
+            entry = self.entries[model_id]
+
+            # Members are held by ensemble requests too, so this also
+            # covers an ensemble in use
+            if entry.in_use:
+                entry.unload_pending = True
+                return
+
+            # A fused ensemble cannot outlive its members
+            for other in self.entries.values():
+                if model_id in other.members and other.loaded:
+                    self.unload(other.model_id)
+
+            if entry.loaded:
+                entry.unload()
+                print(f"♻️ Unloaded {model_id}")
+            self._lru.pop(model_id, None)
+
+    def status(self):
+        with self._lock:
+            return {
+                "model_dir": self.model_dir,
+                "memory_budget_mb": self.memory_budget / 2 ** 20 or None,
+                "loaded_memory_mb": round(self.loaded_bytes() / 2 ** 20, 2),
+                "models": [e.status() for e in self.entries.values()],
+            }
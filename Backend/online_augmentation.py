@@ -0,0 +1,197 @@
+import os
+import functools
+import multiprocessing as mp
+import numpy as np
+
+from dataset_store import open_waveform_store
+from features import TIME_STEPS, FEATURE_DIM
+
+WAVEFORM_DIR = "data/waveforms"
+
+AUG_WORKERS = os.cpu_count() or 1
+DRAWS_PER_FILE = 14  # 1 original + AUG_PER_FILE copies per epoch, as offline
+CLEAN_DRAW = 0  # draw id left un-augmented
+
+# "waveform" (librosa pitch shift / time stretch) or "spectral" (mel domain)
+AUG_MODE = os.getenv("AUG_MODE", "waveform")
+SPECTRAL_BATCH = 16  # also the chunk size for clean (validation) features
+CLEAN_SPECTRUM_CACHE = 256
+
+_worker_samples = None
+_worker_manifest = None
+
+
+def _init_worker(store_dir):
+    global _worker_samples, _worker_manifest
+    _worker_samples, _worker_manifest = open_waveform_store(store_dir)
+
+
+def _recording(i):
+    start = _worker_manifest["offsets"][i]
+    return np.asarray(_worker_samples[start:start + _worker_manifest["lengths"][i]])
+
+
+def _augmented_features(task):
+    from data_pipeline import augment_audio, extract_feature_matrix
+
+    i, draw, seed_entropy = task
+    sr = _worker_manifest["sr"]
+    y = _recording(i)
+    if draw != CLEAN_DRAW:
+        rng = np.random.default_rng(np.random.SeedSequence(seed_entropy))
+        y = augment_audio(y, sr, rng)
+    return extract_feature_matrix(y.astype(np.float32), sr=sr), _worker_manifest["labels"][i]
+
+
+@functools.lru_cache(maxsize=CLEAN_SPECTRUM_CACHE)
+def _clean_spectrum(i):
+    from audio_preprocessing import preprocess_audio
+    from spectral_augmentation import clean_mel
+
+    y_speech, sr, prosody = preprocess_audio(_recording(i), sr=_worker_manifest["sr"])
+    mel, peak_db = clean_mel(y_speech, sr)
+    return mel, peak_db, prosody
+
+
+def _spectral_features(tasks):
+    from spectral_augmentation import stack_mels, clean_features_batch, spectral_augment_batch
+
+    rows = [None] * len(tasks)
+    for clean in (True, False):
+        picked = [k for k, (_, d, _) in enumerate(tasks) if (d == CLEAN_DRAW) == clean]
+        if not picked:
+            continue
+
+        mels, peaks, prosody = zip(*(_clean_spectrum(tasks[k][0]) for k in picked))
+        mel, lengths = stack_mels(mels)
+        if clean:
+            out = clean_features_batch(mel, lengths, np.array(peaks), np.stack(prosody))
+        else:
+            rngs = [np.random.default_rng(np.random.SeedSequence(tasks[k][2])) for k in picked]
+            out = spectral_augment_batch(
+                mel, lengths, np.array(peaks), np.stack(prosody), rngs, sr=_worker_manifest["sr"]
+            )
+        for k, row in zip(picked, out):
+            rows[k] = row
+
+    return [(row, _worker_manifest["labels"][i]) for row, (i, _, _) in zip(rows, tasks)]
+
+
+def _clean_features(indices):
+    from data_pipeline import extract_feature_matrices
+
+    recordings = [_recording(i) for i in indices]
+    X = extract_feature_matrices(recordings, sr=_worker_manifest["sr"])
+    return X, [_worker_manifest["labels"][i] for i in indices]
+
+
+class OnlineAugmenter:
+    """
+    Producer pool that turns stored raw waveforms into fresh augmented
+    (300, 47) feature matrices every epoch.
+
+    Each epoch draws every training recording `draws_per_file` times:
+    draw 0 is the clean recording, as in the offline dataset, and draw
+    d > 0 of recording i in epoch e is augmented with seed (seed, e, i, d),
+    so a rerun with the same seed sees the same augmentations.
+
+    augment="spectral" preprocesses each recording once per worker and
+    augments batches of draws in the mel domain.
+    """
+
+    def __init__(
+        self,
+        store_dir=WAVEFORM_DIR,
+        workers=AUG_WORKERS,
+        draws_per_file=DRAWS_PER_FILE,
+        seed=42,
+        augment=AUG_MODE,
+    ):
+        if augment not in ("waveform", "spectral"):
+            raise ValueError(f"Unknown augmentation mode '{augment}'")
+
+        self.store_dir = store_dir
+        self.augment = augment
+        self.draws_per_file = draws_per_file
+        self.seed = seed
+        self.epoch = 0
+
+        _, self.manifest = open_waveform_store(store_dir)
+        self.labels = np.array(self.manifest["labels"], dtype=np.int32)
+
+        # spawn: workers must not inherit the parent's TensorFlow state
+        self._pool = mp.get_context("spawn").Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(store_dir,),
+        )
+
+    def split(self, name):
+        return np.array(self.manifest["splits"][name], dtype=np.int64)
+
+    def clean_features(self, indices):
+        """Un-augmented features for `indices` (e.g. the validation split)."""
+        indices = [int(i) for i in indices]
+        chunks = [indices[k:k + SPECTRAL_BATCH] for k in range(0, len(indices), SPECTRAL_BATCH)]
+
+        X = np.empty((len(indices), TIME_STEPS, FEATURE_DIM), dtype=np.float32)
+        y = np.empty(len(indices), dtype=np.int32)
+        start = 0
+        for X_chunk, y_chunk in self._pool.imap(_clean_features, chunks):
+            X[start:start + len(X_chunk)] = X_chunk
+            y[start:start + len(X_chunk)] = y_chunk
+            start += len(X_chunk)
+        return X, y
+
+    def epoch_tasks(self, indices):
+        rng = np.random.default_rng([self.seed, self.epoch])
+        order = rng.permutation(np.repeat(indices, self.draws_per_file))
+        draw_ids = np.zeros(len(order), dtype=np.int64)
+        counts = {}
+        for k, i in enumerate(order):
+            draw_ids[k] = counts.get(i, 0)
+            counts[i] = draw_ids[k] + 1
+
+        return [
+            (int(i), int(d), [self.seed, self.epoch, int(i), int(d)])
+            for i, d in zip(order, draw_ids)
+        ]
+
+    def generate(self, indices):
+        """Yields (features, label) for one epoch; advances the epoch counter."""
+        tasks = self.epoch_tasks(indices)
+        self.epoch += 1
+
+        if self.augment == "spectral":
+            # Each worker call augments a whole batch of draws in one pass
+            chunks = [tasks[k:k + SPECTRAL_BATCH] for k in range(0, len(tasks), SPECTRAL_BATCH)]
+            for rows in self._pool.imap(_spectral_features, chunks):
+                for features, label in rows:
+                    yield features, np.float32(label)
+            return
+
+        for features, label in self._pool.imap(_augmented_features, tasks, chunksize=4):
+            yield features, np.float32(label)
+
+    def make_tf_dataset(self, indices, batch_size=32):
+        import tensorflow as tf
+
+        n_batches = int(np.ceil(len(indices) * self.draws_per_file / batch_size))
+
+        ds = tf.data.Dataset.from_generator(
+            lambda: self.generate(indices),
+            output_signature=(
+                tf.TensorSpec(shape=(TIME_STEPS, FEATURE_DIM), dtype=tf.float32),
+                tf.TensorSpec(shape=(), dtype=tf.float32),
+            ),
+        )
+
+        return (
+            ds.batch(batch_size)
+            .apply(tf.data.experimental.assert_cardinality(n_batches))
+            .prefetch(tf.data.AUTOTUNE)
+        )
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
@@ -0,0 +1,149 @@
+import os
+import hashlib
+import tempfile
+
+import numpy as np
+
+from feature_cache import file_digest
+
+
+MODEL_DIR = "models"
+PREDICTION_DIR = os.getenv("PREDICTION_DIR", "predictions")
+
+ENSEMBLE_ID = "ensemble"
+ENSEMBLE_MEMBERS = ["cnn_lstm", "gru_attention"]
+
+# Rows hashed per read, so a memory-mapped split is never materialized twice
+DIGEST_CHUNK_ROWS = 1024
+
+
+def model_path(model_id, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"alz_{model_id}_final.keras")
+
+
+def dataset_digest(X, y, chunk_rows=DIGEST_CHUNK_ROWS):
+    """sha256 over the shape, feature bytes and labels of a split"""
+    h = hashlib.sha256()
+    h.update(repr(tuple(X.shape)).encode())
+
+    for start in range(0, len(X), chunk_rows):
+        chunk = np.ascontiguousarray(X[start:start + chunk_rows], dtype=np.float32)
+        h.update(chunk.tobytes())
+
+    h.update(np.ascontiguousarray(y, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+class PredictionStore:
+    """
+    Per-sample probabilities of each model on one dataset split, persisted
+    as .npz files keyed by sha256(model file) + sha256(split).
+
+    A retrained model or a rebuilt dataset changes the key, so stale
+    scores are never read; models are only loaded on a miss. The
+    ensemble is the mean of its members' cached probabilities, exactly
+    what the Average layer of build_ensemble_model computes.
+    """
+
+    def __init__(self, X, y, store_dir=PREDICTION_DIR, model_dir=MODEL_DIR):
+        self.X = X
+        self.y = y
+        self.store_dir = store_dir
+        self.model_dir = model_dir
+        self.data_digest = dataset_digest(X, y)
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def _key(self, model_id):
+        path = model_path(model_id, self.model_dir)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file {path} not found. Did you run train_model.py?")
+        return hashlib.sha256(f"{file_digest(path)}:{self.data_digest}".encode()).hexdigest()
+
+    def _path(self, model_id, key):
+        return os.path.join(self.store_dir, f"{model_id}_{key[:32]}.npz")
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                prob = data["prob"]
+        except Exception:
+            return None
+        return prob if len(prob) == len(self.y) else None
+
+    def _save(self, path, prob):
+        # Unique temp file: parallel pipeline stages may write the same
+        # model's predictions at once
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix=".tmp.npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, prob=prob)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def probabilities(self, model_ids, verbose=1):
+        """
+        Returns dict model_id -> probs (N,) float32. "ensemble" expands to
+        its members, which are then included in the result as well.
+        """
+        wanted = []
+        for model_id in model_ids:
+            for m in (ENSEMBLE_MEMBERS if model_id == ENSEMBLE_ID else [model_id]):
+                if m not in wanted:
+                    wanted.append(m)
+
+        paths = {m: self._path(m, self._key(m)) for m in wanted}
+        result = {}
+        for m in wanted:
+            prob = self._load(paths[m])
+            if prob is not None:
+                print(f"💾 Cached predictions for {m}")
+                result[m] = prob
+                self.hits += 1
+
+        missing = [m for m in wanted if m not in result]
+        if missing:
+            self.misses += len(missing)
+            for m, prob in self._predict(missing, verbose).items():
+                self._save(paths[m], prob)
+                result[m] = prob
+
+        if ENSEMBLE_ID in model_ids:
+            members = np.stack([result[m] for m in ENSEMBLE_MEMBERS])
+            result[ENSEMBLE_ID] = members.sum(axis=0, dtype=np.float32) / np.float32(len(members))
+
+        return result
+
+    def _predict(self, model_ids, verbose):
+        # TensorFlow is only imported when something has to be recomputed
+        from model_registry import load_keras_model
+        from ensemble import build_ensemble_model, predict_ensemble
+
+        models = {}
+        for m in model_ids:
+            print(f"🔹 Loading {m} from {model_path(m, self.model_dir)}...")
+            models[m] = load_keras_model(model_path(m, self.model_dir))
+
+            if models[m].input_shape[1:] != tuple(self.X.shape[1:]):
+                raise ValueError(
+                    f"❌ Model {m} expects {models[m].input_shape[1:]}, "
+                    f"but data has {tuple(self.X.shape[1:])}"
+                )
+
+        X = np.asarray(self.X)
+        print(f"🔮 Predicting with {', '.join(model_ids)}...")
+
+        if len(models) == 1:
+            (m, model), = models.items()
+            return {m: model.predict(X, verbose=verbose).ravel().astype(np.float32)}
+
+        # One fused pass over the data for every missing member
+        probs = predict_ensemble(build_ensemble_model(models), models.keys(), X, verbose=verbose)
+        return {m: probs[m].astype(np.float32) for m in model_ids}
@@ -1,6 +1,13 @@
 import os
 import sys
-import subprocess
+import json
+import time
+import hashlib
+import argparse
+import importlib
+import traceback
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
 # ==================================================
 # Ensure backend directory is in PYTHONPATH
@@ -8,85 +15,323 @@ import subprocess
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, BASE_DIR)
 
+from feature_cache import file_digest
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", 2))
+PIPELINE_STATE_FILE = "pipeline_state.json"
+PIPELINE_LOG_DIR = os.path.join("logs", "pipeline")
+
+PROCESSED_INPUTS = ["data/processed/manifest.json", "data/processed/shards"]
+MODEL_FILES = {
+    "cnn_lstm": "models/alz_cnn_lstm_final.keras",
+    "gru_attention": "models/alz_gru_attention_final.keras",
+}
+THRESHOLD_FILE = "thresholds/best_threshold.json"
+
+
+class Stage:
+    """
+    One pipeline step: `module.function(argv)` run in a worker process.
+
+    inputs / outputs are files or directories (relative to Backend/);
+    a stage depends on every stage whose outputs cover one of its inputs,
+    and is skipped when the content hash of its inputs (and of its
+    outputs) matches the last successful run.
+    """
+
+    def __init__(self, name, title, module, function, argv=None, inputs=(), outputs=()):
+        self.name = name
+        self.title = title
+        self.module = module
+        self.function = function
+        self.argv = list(argv) if argv is not None else None
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+
 # ==================================================
-# Helper to run steps
+# STAGES
 # ==================================================
-def run_step(title, command):
-    print("\n══════════════════════════════")
-    print(f"▶ {title}")
-    print("══════════════════════════════")
+STAGES = [
+    Stage(
+        "process", "PROCESS REAL-WORLD AUDIO → FEATURES",
+        "data_pipeline", "main", [],
+        inputs=["data/raw_real", "data_pipeline.py", "audio_preprocessing.py",
+                "features.py", "spectral_augmentation.py", "dataset_store.py"],
+        outputs=PROCESSED_INPUTS,
+    ),
+    *[
+        Stage(
+            f"train_{model_id}", f"TRAIN {model_id}",
+            "train_model", "train", [model_id],
+            inputs=PROCESSED_INPUTS + ["train_model.py", "model.py", "model_gru.py", "data_loader.py"],
+            outputs=[model_file],
+        )
+        for model_id, model_file in MODEL_FILES.items()
+    ],
+    Stage(
+        "threshold", "FIND OPTIMAL DECISION THRESHOLD",
+        "find_threshold", "find_best_threshold", None,
+        inputs=PROCESSED_INPUTS + list(MODEL_FILES.values())
+        + ["find_threshold.py", "prediction_store.py", "threshold_metrics.py", "ensemble.py"],
+        outputs=[THRESHOLD_FILE],
+    ),
+    *[
+        Stage(
+            f"evaluate_{model_id}", f"EVALUATE {model_id}",
+            "evaluate_models_multi", "main", [model_id],
+            inputs=PROCESSED_INPUTS + model_files + [THRESHOLD_FILE]
+            + ["evaluate_models_multi.py", "prediction_store.py", "threshold_metrics.py"],
+            outputs=[f"plots/{model_id}_roc.png", f"plots/{model_id}_confusion.png"],
+        )
+        for model_id, model_files in [
+            ("cnn_lstm", [MODEL_FILES["cnn_lstm"]]),
+            ("gru_attention", [MODEL_FILES["gru_attention"]]),
+            ("ensemble", list(MODEL_FILES.values())),
+        ]
+    ],
+]
 
-    result = subprocess.run(
-        command,
-        cwd=BASE_DIR,
-        shell=True
-    )
 
-    if result.returncode != 0:
-        print(f"❌ Failed at: {title}")
-        sys.exit(1)
+# ==================================================
+# Content hashes
+# ==================================================
+class Hasher:
+    """
+    sha256 of files / directory trees. Per-file digests are remembered
+    by (size, mtime) in the state file, so unchanged files (raw audio,
+    feature shards) are not re-read on every run.
+    """
+
+    def __init__(self, known=None):
+        self.known = known or {}
+
+    def file(self, path):
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        entry = self.known.get(path)
+        if entry is None or entry[:2] != stamp:
+            entry = stamp + [file_digest(path)]
+            self.known[path] = entry
+        return entry[2]
+
+    def path(self, path):
+        if os.path.isfile(path):
+            return self.file(path)
+        if not os.path.isdir(path):
+            return None
+
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                h.update(f"{os.path.relpath(full, path)}:{self.file(full)}\n".encode())
+        return h.hexdigest()
+
+    def paths(self, paths):
+        return {p: self.path(p) for p in paths}
+
+
+def stage_signature(stage, hasher):
+    h = hashlib.sha256()
+    h.update(json.dumps([stage.module, stage.function, stage.argv]).encode())
+    h.update(json.dumps(hasher.paths(stage.inputs), sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def load_state(path=PIPELINE_STATE_FILE):
+    if not os.path.exists(path):
+        return {"files": {}, "stages": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=PIPELINE_STATE_FILE):
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def is_up_to_date(stage, signature, state, hasher):
+    record = state["stages"].get(stage.name)
+    if record is None or record["signature"] != signature:
+        return False
+    outputs = hasher.paths(stage.outputs)
+    return None not in outputs.values() and outputs == record["outputs"]
+
+
+def dependencies(stages):
+    """stage name -> names of the stages producing its inputs"""
+    def covers(output, path):
+        return path == output or path.startswith(output.rstrip("/") + "/")
+
+    return {
+        stage.name: {
+            other.name for other in stages
+            if other is not stage
+            and any(covers(out, inp) for out in other.outputs for inp in stage.inputs)
+        }
+        for stage in stages
+    }
+
+
+# ==================================================
+# Worker side
+# ==================================================
+def run_stage(module, function, argv, log_path):
+    """
+    Runs module.function(argv) with stdout / stderr (including
+    TensorFlow's native logs) sent to log_path. Worker processes are
+    reused, so each imports TensorFlow at most once per pipeline run.
+
+    Returns: (ok, wall seconds)
+    """
+    start = time.perf_counter()
+    ok = True
+
+    with open(log_path, "w") as log:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved = os.dup(1), os.dup(2)
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+
+        try:
+            fn = getattr(importlib.import_module(module), function)
+            fn() if argv is None else fn(argv)
+        except SystemExit as e:
+            ok = e.code in (None, 0)
+        except BaseException:
+            traceback.print_exc()
+            ok = False
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+
+    return ok, time.perf_counter() - start
+
+
+def tail(path, n=20):
+    with open(path, errors="replace") as f:
+        return "".join(f.readlines()[-n:])
+
 
 # ==================================================
 # MAIN PIPELINE
 # ==================================================
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the pipeline as a dependency graph")
+    parser.add_argument(
+        "--workers", type=int, default=PIPELINE_WORKERS,
+        help="Stages run at the same time (e.g. both trainings)",
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Rerun every stage even if its inputs are unchanged",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.chdir(BASE_DIR)
+    os.makedirs(PIPELINE_LOG_DIR, exist_ok=True)
+
     print("🚀 Alzheimer Detection – Real-World Pipeline\n")
 
-    # --------------------------------------------------
-    # STEP 1: PROCESS REAL-WORLD DATA (ALWAYS RUN)
-    # --------------------------------------------------
-    run_step(
-        "PROCESS REAL-WORLD AUDIO → FEATURES",
-        "python data_pipeline.py"
-    )
+    state = load_state()
+    hasher = Hasher(state["files"])
+    deps = dependencies(STAGES)
+    stages = {s.name: s for s in STAGES}
 
-    # --------------------------------------------------
-    # STEP 2: Train CNN-LSTM
-    # --------------------------------------------------
-    run_step(
-        "TRAIN cnn_lstm",
-        "python train_model.py cnn_lstm"
-    )
+    pending = list(stages)
+    running = {}
+    report = {}
+    failed = []
+    pipeline_start = time.perf_counter()
 
-    # --------------------------------------------------
-    # STEP 3: Train GRU-Attention
-    # --------------------------------------------------
-    run_step(
-        "TRAIN gru_attention",
-        "python train_model.py gru_attention"
-    )
+    # Trainings running side by side split the cores instead of each
+    # starting a full-size TensorFlow thread pool (inherited by workers)
+    if args.workers > 1 and "TRAIN_THREADS" not in os.environ:
+        os.environ["TRAIN_THREADS"] = str(max(1, (os.cpu_count() or 1) // args.workers))
 
-    # --------------------------------------------------
-    # STEP 4: Find optimal threshold (ensemble-based)
-    # --------------------------------------------------
-    run_step(
-        "FIND OPTIMAL DECISION THRESHOLD",
-        "python find_threshold.py"
-    )
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=mp.get_context("spawn")) as pool:
+        while pending or running:
+            # Launch every stage whose dependencies have all finished;
+            # repeat while skips unblock further stages
+            launched = True
+            while launched and not failed:
+                launched = False
+                busy = {n for n, _, _ in running.values()}
+                for name in list(pending):
+                    if any(d in pending or d in busy for d in deps[name]):
+                        continue
 
-    # --------------------------------------------------
-    # STEP 5: Evaluate CNN-LSTM
-    # --------------------------------------------------
-    run_step(
-        "EVALUATE cnn_lstm",
-        "python evaluate_models_multi.py cnn_lstm"
-    )
+                    pending.remove(name)
+                    launched = True
+                    stage = stages[name]
+                    signature = stage_signature(stage, hasher)
 
-    # --------------------------------------------------
-    # STEP 6: Evaluate GRU-Attention
-    # --------------------------------------------------
-    run_step(
-        "EVALUATE gru_attention",
-        "python evaluate_models_multi.py gru_attention"
-    )
+                    if not args.force and is_up_to_date(stage, signature, state, hasher):
+                        print(f"⏭  {stage.title} (up to date)")
+                        report[name] = ("skipped", 0.0)
+                        continue
 
-    # --------------------------------------------------
-    # STEP 7: Evaluate Ensemble
-    # --------------------------------------------------
-    run_step(
-        "EVALUATE ensemble",
-        "python evaluate_models_multi.py ensemble"
-    )
+                    log_path = os.path.join(PIPELINE_LOG_DIR, f"{name}.log")
+                    print(f"▶ {stage.title} (log: {log_path})")
+                    future = pool.submit(run_stage, stage.module, stage.function, stage.argv, log_path)
+                    running[future] = (name, signature, log_path)
+                    busy.add(name)
+
+            if not running:
+                # Nothing left that can start (skips only, or a failure upstream)
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, signature, log_path = running.pop(future)
+                stage = stages[name]
+
+                try:
+                    ok, seconds = future.result()
+                except Exception as e:
+                    print(f"❌ Worker for {stage.title} died: {e}")
+                    ok, seconds = False, 0.0
+
+                if ok:
+                    print(f"✅ {stage.title} ({seconds:.1f}s)")
+                    state["stages"][name] = {
+                        "signature": signature,
+                        "outputs": hasher.paths(stage.outputs),
+                        "seconds": round(seconds, 2),
+                    }
+                    save_state(state)
+                    report[name] = ("ran", seconds)
+                else:
+                    print(f"❌ Failed at: {stage.title}")
+                    if os.path.exists(log_path):
+                        print(tail(log_path))
+                    report[name] = ("failed", seconds)
+                    failed.append(name)
+
+    total = time.perf_counter() - pipeline_start
+    save_state(state)
+
+    print("\n══════════════════════════════")
+    print("⏱ Stage timings")
+    print("══════════════════════════════")
+    for name in stages:
+        status, seconds = report.get(name, ("not run", 0.0))
+        print(f"  {name:<24} {status:<8} {seconds:8.1f}s")
+    print(f"  {'total (wall)':<24} {'':<8} {total:8.1f}s")
+
+    if failed:
+        sys.exit(1)
 
     print("\n✅ REAL-WORLD PIPELINE COMPLETED SUCCESSFULLY")
 
@@ -94,4 +339,4 @@ def main():
 # ENTRY POINT
 # ==================================================
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -0,0 +1,232 @@
+import numpy as np
+import librosa
+
+from features import (
+    TIME_STEPS as MAX_TIME_STEPS,
+    FEATURE_DIM,
+    MFCC_PARAMS,
+    N_MELS,
+    AMIN,
+    power_to_db_batch,
+    mfcc_from_db,
+    write_feature_rows,
+)
+
+N_FFT = MFCC_PARAMS["n_fft"]
+HOP_LENGTH = MFCC_PARAMS["hop_length"]
+
+# Same probabilities and pitch / stretch ranges as the waveform augmentation
+# in data_pipeline, plus SpecAugment-style masking on the log-mel spectrogram.
+# Noise differs: the waveform path adds sigma=0.005 noise to the raw recording
+# before normalization, which has no fixed level in the normalized spectrogram,
+# so here it is drawn as an SNR relative to the speech power
+SPEC_AUG_PARAMS = {
+    "noise_prob": 0.6,
+    "noise_snr_db": (20.0, 35.0),
+    "pitch_prob": 0.5,
+    "pitch_steps": (-2.0, 2.0),
+    "stretch_prob": 0.5,
+    "stretch_rate": (0.9, 1.1),
+    "mask_prob": 0.5,
+    "freq_masks": 2,
+    "freq_mask_max": 12,
+    "time_masks": 2,
+    "time_mask_max": 20,
+}
+
+# Clean mel frames needed to fill MAX_TIME_STEPS at the fastest stretch
+MEL_FRAMES = int(np.ceil((MAX_TIME_STEPS - 1) * SPEC_AUG_PARAMS["stretch_rate"][1])) + 2
+
+_filter_cache = {}
+
+
+def _mel_filters(sr):
+    if sr not in _filter_cache:
+        basis = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS)
+        centers = librosa.mel_frequencies(n_mels=N_MELS + 2, fmax=sr / 2)[1:-1]
+        _filter_cache[sr] = (basis, centers)
+    return _filter_cache[sr]
+
+
+def clean_mel(y_speech, sr, max_frames=MEL_FRAMES):
+    """
+    The one STFT of a recording: mel power spectrogram (N_MELS, <= max_frames)
+    of the preprocessed speech, with the same settings as the MFCC features.
+
+    Returns: mel, peak_db of the whole recording (librosa's top_db floor
+    is relative to it, not to the frames kept)
+    """
+    mel = librosa.feature.melspectrogram(
+        y=y_speech, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH, n_mels=N_MELS
+    )
+    peak_db = 10.0 * np.log10(max(AMIN, float(mel.max()))) if mel.size else -np.inf
+    return mel[:, :max_frames], peak_db
+
+
+def stack_mels(mels):
+    """Zero-pads a list of (N_MELS, T_i) spectrograms into (B, N_MELS, T_max), lengths (B,)"""
+    lengths = np.array([m.shape[1] for m in mels], dtype=np.int64)
+    out = np.zeros((len(mels), N_MELS, max(1, lengths.max())), dtype=np.float64)
+    for b, m in enumerate(mels):
+        out[b, :, :lengths[b]] = m
+    return out, lengths
+
+
+def draw_params(rngs, params=SPEC_AUG_PARAMS):
+    """
+    One augmentation draw per rng (one rng per output row, so a row does
+    not depend on which batch it lands in). Returns a dict of (B,) / (B, k) arrays.
+    """
+    B = len(rngs)
+    p = {
+        "pitch_factor": np.ones(B),
+        "stretch_rate": np.ones(B),
+        "snr_db": np.full(B, np.inf),
+        "freq_start": np.zeros((B, params["freq_masks"]), dtype=np.int64),
+        "freq_width": np.zeros((B, params["freq_masks"]), dtype=np.int64),
+        "time_start": np.zeros((B, params["time_masks"]), dtype=np.int64),
+        "time_width": np.zeros((B, params["time_masks"]), dtype=np.int64),
+        "noise": [None] * B,
+    }
+
+    for b, rng in enumerate(rngs):
+        if rng.random() < params["noise_prob"]:
+            p["snr_db"][b] = rng.uniform(*params["noise_snr_db"])
+            # |complex gaussian|^2 per bin / frame
+            p["noise"][b] = rng.exponential(1.0, size=(N_MELS, MAX_TIME_STEPS))
+
+        if rng.random() < params["pitch_prob"]:
+            p["pitch_factor"][b] = 2.0 ** (rng.uniform(*params["pitch_steps"]) / 12)
+
+        if rng.random() < params["stretch_prob"]:
+            p["stretch_rate"][b] = rng.uniform(*params["stretch_rate"])
+
+        if rng.random() < params["mask_prob"]:
+            k = params["freq_masks"]
+            p["freq_width"][b] = rng.integers(0, params["freq_mask_max"] + 1, size=k)
+            p["freq_start"][b] = rng.integers(0, N_MELS - p["freq_width"][b] + 1)
+            k = params["time_masks"]
+            p["time_width"][b] = rng.integers(0, params["time_mask_max"] + 1, size=k)
+            p["time_start"][b] = rng.integers(0, MAX_TIME_STEPS - p["time_width"][b] + 1)
+
+    return p
+
+
+def _frequency_warp(mel, factor, sr):
+    """Pitch shift by `factor`: power at f moves to f * factor (interpolated on mel centres)."""
+    _, centers = _mel_filters(sr)
+    src = np.interp(centers[None, :] / factor[:, None], centers, np.arange(N_MELS))
+    lo = np.minimum(np.floor(src).astype(np.int64), N_MELS - 2)
+    frac = (src - lo)[:, :, None]
+    rows = np.arange(len(mel))[:, None]
+    return mel[rows, lo] * (1 - frac) + mel[rows, lo + 1] * frac
+
+
+def _time_warp(mel, lengths, rate):
+    """Time stretch by `rate` onto MAX_TIME_STEPS output frames; returns mel, new lengths."""
+    T = mel.shape[2]
+    pos = np.arange(MAX_TIME_STEPS)[None, :] * rate[:, None]
+    lo = np.minimum(np.floor(pos).astype(np.int64), max(T - 2, 0))
+    hi = np.minimum(lo + 1, T - 1)
+    frac = (pos - lo)[:, None, :]
+
+    rows = np.arange(len(mel))[:, None]
+    # advanced indices around the slice put (B, MAX_TIME_STEPS) first
+    out = mel[rows, :, lo].transpose(0, 2, 1) * (1 - frac) \
+        + mel[rows, :, hi].transpose(0, 2, 1) * frac
+
+    new_lengths = np.minimum(
+        np.floor((lengths - 1) / rate).astype(np.int64) + 1, MAX_TIME_STEPS
+    )
+    new_lengths[lengths == 0] = 0
+    return out, new_lengths
+
+
+def _valid_frames(lengths, n_frames=MAX_TIME_STEPS):
+    return np.arange(n_frames)[None, :] < lengths[:, None]
+
+
+def augment_mel_batch(mel, lengths, peak_db, p, sr):
+    """
+    mel: (B, N_MELS, T) clean power spectrograms, lengths (B,), peak_db (B,)
+    Returns augmented log-mel (B, N_MELS, MAX_TIME_STEPS) in dB and the new lengths.
+    """
+    mel = _frequency_warp(mel, p["pitch_factor"], sr)
+    mel, lengths = _time_warp(mel, lengths, p["stretch_rate"])
+
+    valid = _valid_frames(lengths)
+    mel *= valid[:, None, :]
+
+    # White noise at the drawn SNR, spread over the mel bands like a flat PSD
+    noisy = np.isfinite(p["snr_db"])
+    if noisy.any():
+        basis, _ = _mel_filters(sr)
+        shape = basis.sum(axis=1)
+        shape /= shape.sum()
+
+        frame_power = mel.sum(axis=1).sum(axis=1) / np.maximum(lengths, 1)
+        noise_power = frame_power * 10.0 ** (-np.where(noisy, p["snr_db"], 0) / 10)
+
+        for b in np.flatnonzero(noisy):
+            mel[b] += noise_power[b] * shape[:, None] * p["noise"][b] * valid[b]
+
+    mel_db = power_to_db_batch(mel, peak_db)
+
+    # Masked cells take the sample's mean log-mel level
+    fill = (mel_db * valid[:, None, :]).sum(axis=(1, 2)) / np.maximum(lengths * N_MELS, 1)
+    bins = np.arange(N_MELS)[None, None, :]
+    frames = np.arange(MAX_TIME_STEPS)[None, None, :]
+
+    fmask = ((bins >= p["freq_start"][:, :, None])
+             & (bins < (p["freq_start"] + p["freq_width"])[:, :, None])).any(axis=1)
+    tmask = ((frames >= p["time_start"][:, :, None])
+             & (frames < (p["time_start"] + p["time_width"])[:, :, None])).any(axis=1)
+
+    mask = fmask[:, :, None] | tmask[:, None, :]
+    mel_db = np.where(mask, fill[:, None, None], mel_db)
+
+    return mel_db, lengths
+
+
+def features_from_db(mel_db, lengths, prosody):
+    """
+    (B, N_MELS, MAX_TIME_STEPS) log-mel -> (B, MAX_TIME_STEPS, 47) feature rows,
+    laid out exactly like the per-file path in features.py.
+    """
+    out = np.empty((len(mel_db), MAX_TIME_STEPS, FEATURE_DIM), dtype=np.float32)
+    return write_feature_rows(out, mfcc_from_db(mel_db), lengths, prosody)
+
+
+def clean_features_batch(mel, lengths, peak_db, prosody):
+    """Un-augmented rows from clean mel spectrograms (matches the librosa MFCC path)."""
+    n = min(mel.shape[2], MAX_TIME_STEPS)
+    padded = np.zeros((len(mel), N_MELS, MAX_TIME_STEPS))
+    padded[:, :, :n] = mel[:, :, :n]
+
+    mel_db = power_to_db_batch(padded, peak_db)
+    return features_from_db(mel_db, np.minimum(lengths, MAX_TIME_STEPS), prosody)
+
+
+def spectral_augment_batch(mel, lengths, peak_db, prosody, rngs, sr=16000, params=SPEC_AUG_PARAMS):
+    """
+    Augmented feature rows for a batch, one row per rng.
+
+    mel, lengths: (B, N_MELS, T) clean power spectrograms from clean_mel / stack_mels
+    peak_db: (B,) whole-recording peaks from clean_mel
+    prosody: (B, 7) clean prosody vectors
+
+    Pitch shift, time stretch and noise act on the mel power spectrogram,
+    masking on the log-mel, and the MFCCs come out of one DCT, so no
+    STFT / phase vocoder / ISTFT round trip is needed per augmentation.
+    Prosody is taken from the clean recording; pause durations are
+    rescaled by the time-stretch rate and jitter (mean |dF0| in Hz) by
+    the pitch factor.
+    """
+    p = draw_params(rngs, params)
+    mel_db, lengths = augment_mel_batch(mel, lengths, peak_db, p, sr)
+
+    prosody = np.array(prosody, dtype=np.float64)
+    prosody[:, :2] /= p["stretch_rate"][:, None]   # mean_pause, pause_std
+    prosody[:, 5] *= p["pitch_factor"]             # jitter
+
+    return features_from_db(mel_db, lengths, prosody)
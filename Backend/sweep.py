@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from train_model import (
+    LR_CONFIG,
+    BATCH_SIZE,
+    EPOCHS,
+    MODEL_PARAMS,
+    MODEL_IDS,
+    thread_budgets,
+)
+
+SWEEP_DIR = os.getenv("SWEEP_DIR", "sweeps")
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", 2))
+
+TRIALS = 27
+MIN_EPOCHS = 2
+ETA = 3
+SEED = 42
+
+# name -> ("log", lo, hi) | ("uniform", lo, hi) | ("choice", [values])
+SEARCH_SPACE = {
+    "cnn_lstm": {
+        "learning_rate": ("log", 1e-4, 3e-3),
+        "batch_size": ("choice", [16, 32, 64]),
+        "lstm_units": ("choice", [32, 64, 96, 128]),
+        "dropout": ("uniform", 0.2, 0.6),
+    },
+    "gru_attention": {
+        "learning_rate": ("log", 1e-4, 3e-3),
+        "batch_size": ("choice", [16, 32, 64]),
+        "gru_units": ("choice", [64, 96, 128, 192]),
+        "dropout": ("uniform", 0.2, 0.6),
+    },
+}
+
+# Everything else in a trial's params goes to the model builder
+TRAINING_PARAMS = ("learning_rate", "batch_size")
+
+
+def baseline_params(model_id):
+    """The hand-tuned train_model.py settings, always trial 0"""
+    return {
+        "learning_rate": LR_CONFIG[model_id],
+        "batch_size": BATCH_SIZE,
+        **MODEL_PARAMS[model_id],
+    }
+
+
+def sample_params(space, rng):
+    params = {}
+    for name, (kind, *args) in space.items():
+        if kind == "log":
+            params[name] = float(np.exp(rng.uniform(np.log(args[0]), np.log(args[1]))))
+        elif kind == "uniform":
+            params[name] = float(rng.uniform(args[0], args[1]))
+        elif kind == "choice":
+            params[name] = args[0][int(rng.integers(len(args[0])))]
+        else:
+            raise ValueError(f"Unknown search space kind: {kind}")
+    return params
+
+
+def rung_budgets(min_epochs=MIN_EPOCHS, max_epochs=EPOCHS, eta=ETA):
+    """Cumulative epochs per rung: min_epochs * eta^k, ending at max_epochs"""
+    budgets = []
+    epochs = min_epochs
+    while epochs < max_epochs:
+        budgets.append(epochs)
+        epochs *= eta
+    return budgets + [max_epochs]
+
+
+# ==================================================
+# Worker side: one trial rung per call
+# ==================================================
+_worker = {}
+
+
+def init_worker(core_sets):
+    """Pins the worker to one free core set and caps its TensorFlow threads"""
+    from train_model import configure_threads
+
+    cores = core_sets.get()
+    configure_threads(len(cores), cores)
+    _worker["threads"] = len(cores)
+
+
+def _dataset():
+    # Loaded once per worker; memory-mapped, so workers share the shards
+    if "data" not in _worker:
+        from data_loader import load_dataset
+        from train_model import balanced_class_weights
+
+        X_train, y_train, X_val, y_val = load_dataset()
+        _worker["data"] = (X_train, y_train, X_val, y_val, balanced_class_weights(y_train))
+    return _worker["data"]
+
+
+def run_rung(model_id, params, seed, initial_epoch, epochs, checkpoint):
+    """
+    Trains a trial from `initial_epoch` to `epochs`, continuing from its
+    checkpoint (weights + optimizer state) after the first rung.
+
+    Returns: per-epoch val_loss / val_accuracy of this rung, seconds
+    """
+    import tensorflow as tf
+    from tensorflow.keras.optimizers import Adam
+    from data_loader import make_tf_dataset
+    from model_registry import load_keras_model
+    from train_model import build_model
+
+    X_train, y_train, X_val, y_val, class_weights = _dataset()
+    threads = _worker.get("threads")
+    start = time.perf_counter()
+
+    # Workers train many trials; drop the graphs of earlier ones
+    tf.keras.backend.clear_session()
+
+    if initial_epoch > 0:
+        model = load_keras_model(checkpoint)
+    else:
+        tf.keras.utils.set_random_seed(seed)
+        model = build_model(
+            model_id, X_train.shape[1], X_train.shape[2],
+            {k: v for k, v in params.items() if k not in TRAINING_PARAMS},
+        )
+        model.compile(
+            optimizer=Adam(learning_rate=params["learning_rate"]),
+            loss="binary_crossentropy",
+            metrics=["accuracy"],
+        )
+
+    batch_size = int(params["batch_size"])
+    train_ds = make_tf_dataset(
+        X_train, y_train, batch_size=batch_size, shuffle=True,
+        seed=seed + initial_epoch, threads=threads,
+    )
+    val_ds = make_tf_dataset(X_val, y_val, batch_size=batch_size, threads=threads)
+
+    history = model.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=epochs,
+        initial_epoch=initial_epoch,
+        class_weight=class_weights,
+        verbose=0,
+    )
+    model.save(checkpoint)
+
+    return {
+        "val_loss": [float(v) for v in history.history["val_loss"]],
+        "val_accuracy": [float(v) for v in history.history["val_accuracy"]],
+        "seconds": time.perf_counter() - start,
+    }
+
+
+# ==================================================
+# Successive halving
+# ==================================================
+def best_val_loss(trial):
+    """Pruning score: lowest val_loss so far (diverged trials rank last)"""
+    losses = [v for v in trial["val_loss"] if np.isfinite(v)]
+    return min(losses) if losses else float("inf")
+
+
+class TrialLog:
+    """Append-only JSONL record of every trial rung"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, record):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def run_sweep(model_id, trials=TRIALS, min_epochs=MIN_EPOCHS, max_epochs=EPOCHS,
+              eta=ETA, workers=SWEEP_WORKERS, seed=SEED, name=None):
+    """
+    Successive halving: every trial trains for the first rung's epochs,
+    the best 1/eta by val_loss continue to the next rung (resuming from
+    their checkpoints), and so on until max_epochs.
+
+    Returns: the best trial dict (params, best val_loss, epochs trained)
+    """
+    name = name or f"{model_id}_{time.strftime('%Y%m%d_%H%M%S')}"
+    trial_dir = os.path.join(SWEEP_DIR, name)
+    os.makedirs(trial_dir, exist_ok=True)
+    log = TrialLog(os.path.join(SWEEP_DIR, f"{name}.jsonl"))
+
+    seeds = np.random.SeedSequence(seed).spawn(trials)
+    space = SEARCH_SPACE[model_id]
+    live = []
+    for trial_id, ss in enumerate(seeds):
+        rng = np.random.default_rng(ss)
+        live.append({
+            "trial": trial_id,
+            "params": baseline_params(model_id) if trial_id == 0 else sample_params(space, rng),
+            "seed": int(ss.generate_state(1)[0] % 2 ** 31),
+            "checkpoint": os.path.join(trial_dir, f"trial_{trial_id:03d}.keras"),
+            "val_loss": [],
+            "val_accuracy": [],
+            "seconds": 0.0,
+        })
+
+    budgets = rung_budgets(min_epochs, max_epochs, eta)
+    print(f"🔬 Sweep {name}: {trials} trials, rungs at {budgets} epochs, eta={eta}")
+
+    core_sets = mp.get_context("spawn").Queue()
+    for cores in thread_budgets(workers):
+        core_sets.put(cores)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(core_sets,),
+    ) as pool:
+        done_epochs = 0
+        for rung, epochs in enumerate(budgets):
+            futures = {
+                pool.submit(
+                    run_rung, model_id, t["params"], t["seed"],
+                    done_epochs, epochs, t["checkpoint"],
+                ): t
+                for t in live
+            }
+
+            for future in as_completed(futures):
+                t = futures[future]
+                result = future.result()
+                t["val_loss"] += result["val_loss"]
+                t["val_accuracy"] += result["val_accuracy"]
+                t["seconds"] += result["seconds"]
+                print(
+                    f"  rung {rung} | trial {t['trial']:3d} | epochs {epochs:3d} | "
+                    f"best val_loss {best_val_loss(t):.4f} | {result['seconds']:.1f}s"
+                )
+
+            live.sort(key=best_val_loss)
+            last = rung == len(budgets) - 1
+            keep = len(live) if last else max(1, math.ceil(len(live) / eta))
+
+            for rank, t in enumerate(live):
+                status = "finished" if last else ("promoted" if rank < keep else "pruned")
+                log.append({
+                    "sweep": name,
+                    "model_id": model_id,
+                    "trial": t["trial"],
+                    "rung": rung,
+                    "epochs": epochs,
+                    "params": t["params"],
+                    "best_val_loss": best_val_loss(t),
+                    "val_loss": t["val_loss"][-1],
+                    "val_accuracy": t["val_accuracy"][-1],
+                    "seconds": round(t["seconds"], 2),
+                    "status": status,
+                })
+                if status == "pruned" and os.path.exists(t["checkpoint"]):
+                    os.remove(t["checkpoint"])
+
+            live = live[:keep]
+            done_epochs = epochs
+
+    best = live[0]
+    summary = {
+        "sweep": name,
+        "model_id": model_id,
+        "trial": best["trial"],
+        "params": best["params"],
+        "best_val_loss": best_val_loss(best),
+        "epochs": len(best["val_loss"]),
+        "checkpoint": best["checkpoint"],
+        "wall_seconds": round(time.perf_counter() - start, 2),
+    }
+    with open(os.path.join(SWEEP_DIR, f"{name}_best.json"), "w") as f:
+        json.dump(summary, f, indent=4)
+
+    print(f"\n🏆 Best trial {best['trial']}: val_loss {summary['best_val_loss']:.4f}")
+    print(f"   params: {json.dumps(best['params'])}")
+    print(f"⏱ Sweep wall time: {summary['wall_seconds']:.1f}s")
+    print(f"💾 Results: {log.path}")
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep with successive halving")
+    parser.add_argument("model_id", choices=MODEL_IDS)
+    parser.add_argument("--trials", type=int, default=TRIALS)
+    parser.add_argument("--min-epochs", type=int, default=MIN_EPOCHS, help="Epochs of the first rung")
+    parser.add_argument("--max-epochs", type=int, default=EPOCHS, help="Epochs of the last rung")
+    parser.add_argument("--eta", type=int, default=ETA, help="Keep the best 1/eta trials per rung")
+    parser.add_argument(
+        "--workers", type=int, default=SWEEP_WORKERS,
+        help="Trials trained at once, each on its own share of the cores",
+    )
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--name", default=None, help="Sweep name (default: model id + time)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.eta < 2:
+        raise ValueError("eta must be at least 2")
+
+    run_sweep(
+        args.model_id,
+        trials=args.trials,
+        min_epochs=args.min_epochs,
+        max_epochs=args.max_epochs,
+        eta=args.eta,
+        workers=args.workers,
+        seed=args.seed,
+        name=args.name,
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
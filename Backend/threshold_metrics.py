@@ -0,0 +1,103 @@
+import numpy as np
+
+
+# Range the decision threshold is searched in (find_threshold, evaluation plots)
+THRESHOLD_RANGE = (0.1, 0.9)
+
+
+class ThresholdCurve:
+    """
+    Confusion counts of the rule `prob >= t` for every threshold at once.
+
+    The probabilities are sorted once (descending); the true positives of
+    the top-k scores are a cumulative sum of the sorted labels, so TP / FP /
+    FN / TN for any number of thresholds cost O(N log N) in total instead
+    of one full pass (and one sklearn call) per threshold.
+    """
+
+    def __init__(self, y_true, y_prob):
+        y_true = np.asarray(y_true).ravel().astype(np.int64)
+        y_prob = np.asarray(y_prob, dtype=np.float64).ravel()
+
+        order = np.argsort(-y_prob, kind="mergesort")
+        self.scores = y_prob[order]
+        self.tp_at_k = np.concatenate([[0], np.cumsum(y_true[order])])
+        self.n = len(y_true)
+        self.n_pos = int(self.tp_at_k[-1])
+        self.n_neg = self.n - self.n_pos
+
+    def _counts(self, k):
+        """k: number of predicted positives (the k highest scores)"""
+        k = np.asarray(k, dtype=np.int64)
+        tp = self.tp_at_k[k]
+        fp = k - tp
+        fn = self.n_pos - tp
+        tn = self.n_neg - fp
+        return tp, fp, fn, tn
+
+    def at(self, thresholds):
+        """Metrics for arbitrary thresholds (e.g. a plotting grid)."""
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        # scores are descending: count of scores >= t
+        k = np.searchsorted(-self.scores, -thresholds, side="right")
+        return self._metrics(thresholds, k)
+
+    def exact(self):
+        """Metrics at every distinct score, i.e. every threshold that changes a prediction."""
+        if self.n == 0:
+            return self._metrics(np.array([]), np.array([], dtype=np.int64))
+
+        # k = size of each tie group's prefix: ties share one threshold
+        k = np.concatenate([np.flatnonzero(np.diff(self.scores)), [self.n - 1]]) + 1
+        return self._metrics(self.scores[k - 1], k)
+
+    def _metrics(self, thresholds, k):
+        tp, fp, fn, tn = self._counts(k)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # zero_division=0, as the sklearn calls this replaces
+            precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+            recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+            f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+
+        return {
+            "thresholds": thresholds,
+            "tp": tp,
+            "fp": fp,
+            "fn": fn,
+            "tn": tn,
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+            "accuracy": (tp + tn) / max(self.n, 1),
+        }
+
+
+def best_f1_threshold(y_true, y_prob, threshold_range=THRESHOLD_RANGE):
+    """
+    Exact F1-optimal threshold within `threshold_range`.
+
+    Every distinct score in the range is a candidate; on ties the lowest
+    threshold (highest recall) wins. The returned threshold is the midpoint
+    between the chosen score and the next lower score, so it gives the same
+    predictions here but does not sit on a validation sample.
+
+    Returns: threshold, f1 at that threshold
+    """
+    curve = ThresholdCurve(y_true, y_prob)
+    m = curve.exact()
+
+    lo, hi = threshold_range
+    in_range = np.flatnonzero((m["thresholds"] >= lo) & (m["thresholds"] < hi))
+    if len(in_range) == 0:
+        t = 0.5
+        return t, float(curve.at([t])["f1"][0])
+
+    f1 = m["f1"][in_range]
+    best = in_range[len(f1) - 1 - np.argmax(f1[::-1])]
+    score = m["thresholds"][best]
+
+    lower = m["thresholds"][best + 1] if best + 1 < len(m["thresholds"]) else lo
+    threshold = float(max((score + lower) / 2, lo))
+
+    return threshold, float(m["f1"][best])
@@ -1,6 +1,9 @@
 import os
 import sys
+import time
 import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 import tensorflow as tf
 import matplotlib.pyplot as plt
 
@@ -17,7 +20,7 @@ from tensorflow.keras.optimizers import Adam
 
 from model import build_cnn_lstm_model
 from model_gru import build_gru_attention_model
-from data_loader import load_dataset
+from data_loader import load_dataset, make_tf_dataset
 
 
 MODEL_DIR = "models"
@@ -34,62 +37,145 @@ LR_CONFIG = {
 
 REPORT_THRESHOLD = 0.6
 
+# Architecture arguments of the model builders (sweep.py searches around these)
+MODEL_PARAMS = {
+    "cnn_lstm": {"lstm_units": 96, "dropout": 0.5},
+    "gru_attention": {"gru_units": 128, "dropout": 0.3},
+}
+MODEL_BUILDERS = {
+    "cnn_lstm": build_cnn_lstm_model,
+    "gru_attention": build_gru_attention_model,
+}
+MODEL_IDS = list(MODEL_BUILDERS)
+
+# Intra-op threads of a single training run (0 = TensorFlow default, all cores)
+TRAIN_THREADS = int(os.getenv("TRAIN_THREADS", 0))
+
 os.makedirs(MODEL_DIR, exist_ok=True)
 os.makedirs(PLOTS_DIR, exist_ok=True)
 os.makedirs(HISTORY_DIR, exist_ok=True)
 
 
-def train():
-    if len(sys.argv) < 2:
-        print("Usage: python train_model.py <cnn_lstm | gru_attention>")
-        sys.exit(1)
+def build_model(model_id, time_steps, feature_dim, params=None):
+    """Builds model_id with MODEL_PARAMS, overridden by `params`"""
+    kwargs = {**MODEL_PARAMS[model_id], **(params or {})}
+    return MODEL_BUILDERS[model_id](time_steps=time_steps, feature_dim=feature_dim, **kwargs)
+
+
+def balanced_class_weights(y):
+    weights = class_weight.compute_class_weight(
+        class_weight="balanced",
+        classes=np.unique(y),
+        y=y
+    )
+    return {0: weights[0], 1: weights[1]}
+
 
-    MODEL_ID = sys.argv[1]
+class EpochTimer(tf.keras.callbacks.Callback):
+    """Wall time and training throughput of every epoch"""
 
-    if MODEL_ID not in ["cnn_lstm", "gru_attention"]:
+    def __init__(self, model_id, samples_per_epoch):
+        super().__init__()
+        self.model_id = model_id
+        self.samples_per_epoch = samples_per_epoch
+        self.epoch_times = []
+        self._start = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = time.perf_counter() - self._start
+        self.epoch_times.append(seconds)
+        print(
+            f"⏱ [{self.model_id}] epoch {epoch + 1}: {seconds:.1f}s "
+            f"({self.samples_per_epoch / seconds:.0f} samples/s)"
+        )
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def thread_budgets(n_jobs, cores=None):
+    """
+    Splits the usable cores into n_jobs contiguous, disjoint sets
+    (one shared core per job when there are fewer cores than jobs).
+    """
+    cores = available_cores() if cores is None else cores
+    if len(cores) < n_jobs:
+        print(f"⚠️ {n_jobs} jobs on {len(cores)} cores: jobs will share cores")
+        return [[cores[i % len(cores)]] for i in range(n_jobs)]
+    return [[int(c) for c in part] for part in np.array_split(cores, n_jobs)]
+
+
+def configure_threads(threads, cores=None):
+    """
+    Caps TensorFlow at `threads` intra-op threads (and 1-2 inter-op
+    threads); must run before the first op. `cores` pins the process.
+    """
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(2 if threads >= 4 else 1)
+
+
+def train_one(model_id, online_aug=False, threads=TRAIN_THREADS, verbose=1):
+    """
+    Trains and saves one model. `threads` also bounds the tf.data and
+    online-augmentation workers (0 = defaults).
+
+    Returns: summary dict (model_id, epoch_times, samples_per_epoch, seconds)
+    """
+    if model_id not in MODEL_IDS:
         raise ValueError("Invalid model id")
 
-    print("\n📂 Loading dataset...")
-    X_train, y_train, X_val, y_val = load_dataset()
-    time_steps = X_train.shape[1]
-    feature_dim = X_train.shape[2]
+    start = time.perf_counter()
+    augmenter = None
+
+    if online_aug:
+        from online_augmentation import OnlineAugmenter, TIME_STEPS, FEATURE_DIM
+
+        # Fresh augmentations every epoch from the raw waveform store
+        print("\n📂 Opening waveform store (online augmentation)...")
+        augmenter = OnlineAugmenter(workers=threads) if threads else OnlineAugmenter()
+        train_idx = augmenter.split("train")
+        X_val, y_val = augmenter.clean_features(augmenter.split("val"))
+        y_train = augmenter.labels[train_idx]
+        time_steps, feature_dim = TIME_STEPS, FEATURE_DIM
+        samples_per_epoch = len(train_idx) * augmenter.draws_per_file
+    else:
+        print("\n📂 Loading dataset...")
+        # Memory-mapped: concurrent jobs share the shards through the page cache
+        X_train, y_train, X_val, y_val = load_dataset()
+        time_steps = X_train.shape[1]
+        feature_dim = X_train.shape[2]
+        samples_per_epoch = len(y_train)
 
     print(f"🧠 Input shape: (time_steps={time_steps}, feature_dim={feature_dim})")
 
-    weights = class_weight.compute_class_weight(
-        class_weight="balanced",
-        classes=np.unique(y_train),
-        y=y_train
-    )
-    class_weights = {0: weights[0], 1: weights[1]}
+    class_weights = balanced_class_weights(y_train)
 
     print("⚖ Class weights:", class_weights)
 
-    if MODEL_ID == "cnn_lstm":
-        model = build_cnn_lstm_model(
-            time_steps=time_steps,
-            feature_dim=feature_dim,
-            lstm_units=96,
-            dropout=0.5
-        )
-    else:
-        model = build_gru_attention_model(
-            time_steps=time_steps,
-            feature_dim=feature_dim,
-            gru_units=128,
-            dropout=0.3
-        )
+    model = build_model(model_id, time_steps, feature_dim)
 
-    lr = LR_CONFIG[MODEL_ID]
+    lr = LR_CONFIG[model_id]
     model.compile(
         optimizer=Adam(learning_rate=lr),
         loss="binary_crossentropy",
         metrics=["accuracy"]
     )
 
-    print(f"\n🚀 Training {MODEL_ID.upper()} | LR = {lr}")
+    print(f"\n🚀 Training {model_id.upper()} | LR = {lr}")
 
+    timer = EpochTimer(model_id, samples_per_epoch)
     callbacks = [
+        timer,
         EarlyStopping(
             monitor="val_loss",
             patience=10,
@@ -103,18 +189,29 @@ def train():
             verbose=1
         )
     ]
+    if augmenter is not None:
+        train_ds = augmenter.make_tf_dataset(train_idx, batch_size=BATCH_SIZE)
+    else:
+        # Streams batches from the memory-mapped store; never holds X in RAM
+        train_ds = make_tf_dataset(
+            X_train, y_train, batch_size=BATCH_SIZE, shuffle=True, threads=threads or None
+        )
+    val_ds = make_tf_dataset(X_val, y_val, batch_size=BATCH_SIZE, threads=threads or None)
+
     history = model.fit(
-        X_train,
-        y_train,
-        validation_data=(X_val, y_val),
+        train_ds,
+        validation_data=val_ds,
         epochs=EPOCHS,
-        batch_size=BATCH_SIZE,
         class_weight=class_weights,
         callbacks=callbacks,
-        verbose=1
+        verbose=verbose
     )
+
+    if augmenter is not None:
+        augmenter.close()
+
     np.save(
-        os.path.join(HISTORY_DIR, f"{MODEL_ID}_history.npy"),
+        os.path.join(HISTORY_DIR, f"{model_id}_history.npy"),
         history.history
     )
 
@@ -122,19 +219,19 @@ def train():
     plt.plot(history.history["accuracy"], label="Train")
     plt.plot(history.history["val_accuracy"], label="Val")
     plt.legend()
-    plt.title(f"{MODEL_ID.upper()} Accuracy")
-    plt.savefig(os.path.join(PLOTS_DIR, f"{MODEL_ID}_accuracy.png"))
+    plt.title(f"{model_id.upper()} Accuracy")
+    plt.savefig(os.path.join(PLOTS_DIR, f"{model_id}_accuracy.png"))
     plt.close()
 
     plt.figure()
     plt.plot(history.history["loss"], label="Train")
     plt.plot(history.history["val_loss"], label="Val")
     plt.legend()
-    plt.title(f"{MODEL_ID.upper()} Loss")
-    plt.savefig(os.path.join(PLOTS_DIR, f"{MODEL_ID}_loss.png"))
+    plt.title(f"{model_id.upper()} Loss")
+    plt.savefig(os.path.join(PLOTS_DIR, f"{model_id}_loss.png"))
     plt.close()
 
-    y_prob = model.predict(X_val).ravel()
+    y_prob = model.predict(val_ds, verbose=verbose).ravel()
     y_pred = (y_prob >= REPORT_THRESHOLD).astype(int)
 
     print("\n📊 Validation Metrics (reporting only)")
@@ -144,12 +241,83 @@ def train():
     print(f"F1-score  : {f1_score(y_val, y_pred):.4f}")
     print(f"ROC-AUC   : {roc_auc_score(y_val, y_prob):.4f}")
 
-    model_path = os.path.join(MODEL_DIR, f"alz_{MODEL_ID}_final.keras")
+    model_path = os.path.join(MODEL_DIR, f"alz_{model_id}_final.keras")
     model.save(model_path)
 
     print(f"\n💾 Model saved to: {model_path}")
     print("✅ Training complete")
 
+    return {
+        "model_id": model_id,
+        "epoch_times": timer.epoch_times,
+        "samples_per_epoch": samples_per_epoch,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def train_job(model_id, online_aug, cores):
+    """Worker entry point: pins the job to its cores before TensorFlow starts"""
+    configure_threads(len(cores), cores)
+    # One line per epoch: progress bars of concurrent jobs would interleave
+    return train_one(model_id, online_aug, threads=len(cores), verbose=2)
+
+
+def train_concurrent(model_ids, online_aug=False):
+    """
+    Trains several models at once, one spawned process per model, each
+    with its own disjoint share of the cores. Returns the job summaries.
+    """
+    budgets = thread_budgets(len(model_ids))
+    for model_id, cores in zip(model_ids, budgets):
+        print(f"🧵 {model_id}: {len(cores)} threads on cores {cores[0]}-{cores[-1]}")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(len(model_ids), mp_context=mp.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(train_job, model_id, online_aug, cores)
+            for model_id, cores in zip(model_ids, budgets)
+        ]
+        summaries = [f.result() for f in futures]
+    wall = time.perf_counter() - start
+
+    print("\n══════════════════════════════")
+    print("⏱ Concurrent training")
+    print("══════════════════════════════")
+    total_samples = 0
+    for s in summaries:
+        epochs = len(s["epoch_times"])
+        samples = epochs * s["samples_per_epoch"]
+        total_samples += samples
+        mean_epoch = np.mean(s["epoch_times"]) if epochs else 0.0
+        print(
+            f"  {s['model_id']:<14} {epochs:3d} epochs | {mean_epoch:6.1f}s / epoch | "
+            f"{s['seconds']:7.1f}s total"
+        )
+    print(f"  {'wall':<14} {wall:7.1f}s (sum of jobs {sum(s['seconds'] for s in summaries):.1f}s)")
+    print(f"  {'throughput':<14} {total_samples / wall:7.0f} samples/s combined")
+
+    return summaries
+
+
+def train(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    model_ids = [a for a in argv if not a.startswith("--")]
+    online_aug = "--online-aug" in argv
+
+    if len(model_ids) < 1:
+        print("Usage: python train_model.py <cnn_lstm | gru_attention> [more model ids] [--online-aug]")
+        sys.exit(1)
+
+    for model_id in model_ids:
+        if model_id not in MODEL_IDS:
+            raise ValueError("Invalid model id")
+
+    if len(model_ids) > 1:
+        return train_concurrent(model_ids, online_aug)
+
+    configure_threads(TRAIN_THREADS)
+    return train_one(model_ids[0], online_aug)
+
 
 if __name__ == "__main__":
-    train()
+    train(sys.argv[1:])